@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of the per-record cost of serializing Neo4j sources for a tool
+response, on a synthetic 10k-source web. No database is needed: Bolt records
+are built in memory with the values the driver would hand back.
+
+    dict path:   RETURN s {.*, created: toString(s.created), ...}
+                 -> record.data() -> serialize_source() -> repr in an f-string
+    record path: RETURN <SOURCE_COLUMNS>, also with toString() temporals
+                 -> SourceRecord(*record) -> core.encoding.dumps
+    native path: the record path with neo4j.time values formatted in Python
+
+Usage:
+    uv run python -m bench.serialization [n_sources] [repeats]
+"""
+
+import sys
+import time
+from uuid import uuid4
+from neo4j import Record
+from neo4j.time import DateTime
+from core.encoding import dumps
+from models.records import SourceRecord
+
+
+def serialize_source(source):
+    # the projection Neo4jClient.serialize_source made before the record path
+    return {
+        "sourceId": source["sourceId"],
+        "userId": source["userId"],
+        "name": source["name"],
+        "url": source.get("url") or None,
+        "content": source["content"],
+        "webId": source["webId"],
+        "created": source["created"],
+        "updated": source["updated"],
+        "size": source.get("size") or None,
+    }
+
+
+def make_sources(n):
+    web_id = str(uuid4())
+    user_id = str(uuid4())
+    created = DateTime(2025, 5, 14, 12, 30, 5, 123456789)
+    for i in range(n):
+        yield {
+            "sourceId": str(uuid4()),
+            "webId": web_id,
+            "userId": user_id,
+            "name": f"Chat about topic {i}",
+            "type": "note",
+            "url": None,
+            "content": "user: hello\nassistant: hi, how can I help?\n" * 8,
+            "size": 8000,
+            "created": created,
+            "updated": created,
+        }
+
+
+def to_strings(source):
+    # the server already ran toString() on the temporal values
+    return {
+        **source,
+        "created": source["created"].iso_format(),
+        "updated": source["updated"].iso_format(),
+    }
+
+
+def dict_records(sources):
+    return [Record({"s": to_strings(source)}) for source in sources]
+
+
+def tuple_records(sources):
+    return [Record(to_strings(source)) for source in sources]
+
+
+def native_records(sources):
+    return [Record(source) for source in sources]
+
+
+def dict_path(records):
+    sources = [record.data()["s"] for record in records]
+    return f"Query context: {[serialize_source(source) for source in sources]}"
+
+
+def record_path(records):
+    return f"Query context: {dumps([SourceRecord(*record) for record in records])}"
+
+
+def measure(name, path, records, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = path(records)
+        best = min(best, time.perf_counter() - started)
+    per_record = best / len(records) * 1e6
+    print(
+        f"{name:<12} {best * 1000:8.2f} ms total  {per_record:6.2f} us/record  "
+        f"{len(output) / len(records):7.1f} bytes/record"
+    )
+    return per_record
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    sources = list(make_sources(n))
+    print(f"Serializing {n} sources, best of {repeats}")
+    baseline = measure("dict path", dict_path, dict_records(sources), repeats)
+    fast = measure("record path", record_path, tuple_records(sources), repeats)
+    measure("native path", record_path, native_records(sources), repeats)
+    print(f"speedup      {baseline / fast:.2f}x")
@@ -0,0 +1,102 @@
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from core.config import settings
+from core.encoding import dumps
+
+
+class LocalCache:
+    """
+    In-process TTL cache with LRU eviction. Used when no shared cache is
+    configured, so each worker process keeps its own entries.
+    """
+
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        # values are stored serialized, like in Redis, so callers can't mutate them
+        value = dumps(value)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            _, value = self.entries.get(key, (float("inf"), "0"))
+            count = int(value) + 1
+            self.entries[key] = (float("inf"), str(count))
+            self.entries.move_to_end(key)
+        return count
+
+
+class RedisCache:
+    """
+    Cache shared by all worker processes, backed by Redis. A failing or slow
+    Redis is treated as a cache miss, so callers fall back to the backends.
+    """
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(
+                "CACHE_URL points at Redis but the redis package is not installed, "
+                "install spydr-mcp[redis]"
+            ) from e
+
+        self.errors = redis.RedisError
+        self.client = redis.Redis.from_url(
+            url,
+            socket_timeout=settings.cache_timeout_seconds,
+            socket_connect_timeout=settings.cache_timeout_seconds,
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.client.get(key)
+        except self.errors as e:
+            print(f"ERROR reading cache key {key}: {e}", file=sys.stderr)
+            return None
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.client.set(key, dumps(value), px=int(ttl * 1000))
+        except self.errors as e:
+            print(f"ERROR writing cache key {key}: {e}", file=sys.stderr)
+
+    def incr(self, key: str) -> Optional[int]:
+        try:
+            return self.client.incr(key)
+        except self.errors as e:
+            print(f"ERROR incrementing cache key {key}: {e}", file=sys.stderr)
+            return None
+
+
+def create_cache(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    return LocalCache(settings.local_cache_max_entries)
+
+
+cache = create_cache(settings.cache_url)
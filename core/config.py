@@ -22,6 +22,46 @@ class Settings(BaseSettings):
     pinecone_api_key: str
     pinecone_index_name: str
 
+    # admission control
+    tool_deadline_seconds: float = 30.0
+    user_requests_per_second: float = 5.0
+    user_request_burst: float = 20.0
+    backend_max_queue: int = 16
+    pinecone_inference_max_concurrency: int = 4
+    pinecone_query_max_concurrency: int = 8
+    neo4j_max_concurrency: int = 16
+    mongo_max_concurrency: int = 16
+
+    # hybrid search, weight of the dense score (1.0 is dense only)
+    hybrid_alpha: float = 1.0
+
+    # MMR re-ranking, candidates over-fetched and relevance/diversity trade-off
+    mmr_fetch_k: int = 50
+    mmr_lambda: float = 0.7
+
+    # automatic connections for webs with enableAIConnections
+    ai_connection_threshold: float = 0.85
+    ai_connection_max: int = 5
+    ai_connection_cached_webs: int = 32
+    ai_connection_cache_max_sources: int = 2000
+
+    # HTTP deployment and cache tier shared by its workers (redis://... or empty for in-process)
+    http_host: str = "0.0.0.0"
+    http_port: int = 8000
+    http_workers: int = 4
+    cache_url: str = ""
+    local_cache_max_entries: int = 10000
+    embedding_cache_ttl_seconds: float = 86400.0
+    result_cache_ttl_seconds: float = 60.0
+    cache_timeout_seconds: float = 0.5
+
+    # background reconciliation of Neo4j, MongoDB and Pinecone
+    reconciler_enabled: bool = True
+    reconciler_interval_seconds: float = 300.0
+    reconciler_batch_size: int = 100
+    reconciler_batches_per_second: float = 1.0
+    reconciler_max_batches: int = 50
+
     class Config:
         env_file = env_path
         ignore_extra = True
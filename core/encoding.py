@@ -0,0 +1,25 @@
+import json
+from datetime import date, datetime, time
+from typing import Any
+
+
+def _default(value: Any) -> Any:
+    # Neo4j temporal values (and anything else with iso_format) that were not
+    # already formatted by toString() in Cypher
+    if hasattr(value, "iso_format"):
+        return value.iso_format()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if hasattr(value, "__slots__"):  # records from models.records
+        return {name: getattr(value, name) for name in value.__slots__}
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# one compact encoder shared by every tool response and cache entry
+encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def dumps(value: Any) -> str:
+    return encoder.encode(value)
@@ -0,0 +1,232 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional
+from core.config import settings
+
+
+class OverloadedError(RuntimeError):
+    """Raised when a call is shed instead of queued (queue full or rate limited)."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call cannot be admitted before the tool call's deadline."""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+
+class BackendLimiter:
+    """
+    Bounds the number of in-flight calls to a single backend.
+
+    At most `max_concurrency` calls run at once and at most `max_queue` calls
+    wait for a slot. Anything beyond that is rejected immediately with an
+    OverloadedError so that a burst fails fast instead of piling up behind a
+    saturated pool.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def slot(self, timeout: Optional[float]) -> Iterator[None]:
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise OverloadedError(
+                    f"{self.name} is overloaded ({self.in_flight} in flight, {self.waiting} queued)"
+                )
+            self.waiting += 1
+
+        started = time.monotonic()
+        try:
+            acquired = self.semaphore.acquire(
+                timeout=max(timeout, 0.0) if timeout is not None else None
+            )
+        finally:
+            waited = time.monotonic() - started
+            with self.lock:
+                self.waiting -= 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+        if not acquired:
+            with self.lock:
+                self.timed_out += 1
+            raise DeadlineExceededError(
+                f"Deadline exceeded waiting {waited:.3f}s for {self.name}"
+            )
+
+        with self.lock:
+            self.in_flight += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "maxQueue": self.max_queue,
+                "inFlight": self.in_flight,
+                "queued": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timedOut": self.timed_out,
+                "avgWaitMs": (
+                    round(self.total_wait / (self.admitted + self.timed_out) * 1000, 3)
+                    if self.admitted + self.timed_out
+                    else 0.0
+                ),
+                "maxWaitMs": round(self.max_wait * 1000, 3),
+            }
+
+
+class Governor:
+    """
+    Admission control for tool calls and the database clients behind them.
+
+    A tool call enters through `request()`, which charges the caller's token
+    bucket and sets a deadline for everything the call does. Database calls go
+    through `limit()` (or the `guarded()` decorator), which waits for a slot on
+    the backend's limiter no longer than the remaining deadline.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_queue: int,
+        user_rate: float,
+        user_burst: float,
+        default_timeout: float,
+    ) -> None:
+        self.backends = {
+            name: BackendLimiter(name, concurrency, max_queue)
+            for name, concurrency in limits.items()
+        }
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.default_timeout = default_timeout
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.buckets_lock = threading.Lock()
+        self.throttled = 0
+
+    def bucket_for(self, user_id: str) -> TokenBucket:
+        with self.buckets_lock:
+            bucket = self.buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, self.user_burst)
+                self.buckets[user_id] = bucket
+            return bucket
+
+    @staticmethod
+    def remaining() -> Optional[float]:
+        """Seconds left before the current call's deadline, or None if unbounded."""
+        deadline = _deadline.get()
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    @contextmanager
+    def deadline(self, seconds: float) -> Iterator[None]:
+        # never extend a deadline set further up the call stack
+        deadline = time.monotonic() + seconds
+        current = _deadline.get()
+        if current is not None:
+            deadline = min(deadline, current)
+        token = _deadline.set(deadline)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    @contextmanager
+    def request(self, user_id: str, timeout: Optional[float] = None) -> Iterator[None]:
+        if not self.bucket_for(user_id).try_acquire():
+            self.throttled += 1
+            raise OverloadedError(f"Rate limit exceeded for user {user_id}")
+        with self.deadline(timeout if timeout is not None else self.default_timeout):
+            yield
+
+    @contextmanager
+    def limit(self, backend: str) -> Iterator[None]:
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Deadline exceeded before calling {backend}")
+        with self.backends[backend].slot(remaining):
+            yield
+
+    def guarded(self, backend: str) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.limit(backend):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.buckets_lock:
+            users = len(self.buckets)
+        return {
+            "backends": {
+                name: limiter.metrics() for name, limiter in self.backends.items()
+            },
+            "users": users,
+            "throttled": self.throttled,
+        }
+
+
+governor = Governor(
+    limits={
+        "pinecone_inference": settings.pinecone_inference_max_concurrency,
+        "pinecone_query": settings.pinecone_query_max_concurrency,
+        "neo4j": settings.neo4j_max_concurrency,
+        "mongodb": settings.mongo_max_concurrency,
+    },
+    max_queue=settings.backend_max_queue,
+    user_rate=settings.user_requests_per_second,
+    user_burst=settings.user_request_burst,
+    default_timeout=settings.tool_deadline_seconds,
+)
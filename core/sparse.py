@@ -0,0 +1,138 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# compound tokens (urls, emails, dotted names, error codes) are kept whole and
+# also split into their parts, so both "ERR_CONN_RESET" and "reset" match;
+# separators may repeat so "https://x.com/a?b=1" stays one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/:@#?=&%~]+[a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by for from has have i if in into is it its me my
+    of on or our so that the their then there these they this to was we were
+    what when which who will with you your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group(0)
+        if token not in STOPWORDS:
+            tokens.append(token)
+        if PART_PATTERN.fullmatch(token) is None:
+            tokens.extend(
+                part for part in PART_PATTERN.findall(token) if part not in STOPWORDS
+            )
+    return tokens
+
+
+def token_index(token: str) -> int:
+    # sparse indices are uint32 in Pinecone, so a crc32 of the token fits as is
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class BM25Encoder:
+    """
+    Local BM25 sparse encoder for hybrid search.
+
+    Document frequencies are built incrementally as sources are ingested (see
+    `add_document`) rather than fitted once over a fixed corpus. Documents are
+    encoded with the raw BM25 term-frequency component, already saturated and
+    length-normalized, and queries with the IDF component normalized to sum to
+    1, so the dot product is the BM25 score scaled by the query's total IDF.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.n_docs = 0
+        self.total_length = 0
+        self.df: Dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def term_counts(text: str) -> Tuple[Counter, int]:
+        tokens = tokenize(text)
+        return Counter(token_index(token) for token in tokens), len(tokens)
+
+    def add_document(self, text: str) -> Dict[int, int]:
+        """
+        Adds a document to the vocabulary statistics.
+
+        Returns:
+            Dict[int, int]: The term counts of the document, keyed by sparse index.
+        """
+        counts, length = self.term_counts(text)
+        with self.lock:
+            self.n_docs += 1
+            self.total_length += length
+            for index in counts:
+                self.df[index] = self.df.get(index, 0) + 1
+        return dict(counts)
+
+    def load(self, n_docs: int, total_length: int, df: Iterable[Tuple[int, int]]) -> None:
+        with self.lock:
+            self.n_docs = n_docs
+            self.total_length = total_length
+            self.df = dict(df)
+
+    @staticmethod
+    def _normalized(weights: Dict[int, float]) -> Dict[str, List]:
+        total = sum(weights.values())
+        if total <= 0:
+            return {"indices": [], "values": []}
+        indices = sorted(weights)
+        return {
+            "indices": indices,
+            "values": [weights[index] / total for index in indices],
+        }
+
+    def encode_document(self, text: str) -> Dict[str, List]:
+        counts, length = self.term_counts(text)
+        with self.lock:
+            avg_length = self.total_length / self.n_docs if self.n_docs else length
+        norm = self.k1 * (1 - self.b + self.b * length / max(avg_length, 1))
+        # not normalized: dividing by the number of distinct terms would bury
+        # exact matches in long documents under the dense score
+        indices = sorted(counts)
+        return {
+            "indices": indices,
+            "values": [
+                counts[index] * (self.k1 + 1) / (counts[index] + norm)
+                for index in indices
+            ],
+        }
+
+    def encode_query(self, text: str) -> Dict[str, List]:
+        counts, _ = self.term_counts(text)
+        with self.lock:
+            n_docs = self.n_docs
+            df = {index: self.df.get(index, 0) for index in counts}
+        return self._normalized(
+            {
+                index: math.log(1 + (n_docs - df[index] + 0.5) / (df[index] + 0.5))
+                for index in counts
+            }
+        )
+
+
+def hybrid_scale(
+    dense: List[float], sparse: Dict[str, List], alpha: float
+) -> Tuple[List[float], Dict[str, List]]:
+    """
+    Weights a dense and a sparse query vector for a dotproduct index so that
+    the resulting score is alpha * dense + (1 - alpha) * sparse.
+    """
+    if not 0 <= alpha <= 1:
+        raise ValueError("alpha must be between 0 and 1")
+    return [value * alpha for value in dense], {
+        "indices": sparse["indices"],
+        "values": [value * (1 - alpha) for value in sparse["values"]],
+    }
@@ -0,0 +1,134 @@
+import numpy as np
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+_similarity_cache: ContextVar[Optional[Dict[Tuple[str, ...], np.ndarray]]] = (
+    ContextVar("similarity_cache", default=None)
+)
+
+
+@contextmanager
+def similarity_cache() -> Iterator[None]:
+    """
+    Caches similarity matrices for the duration of a request, so re-ranking
+    the same candidate set twice (e.g. for different k) computes it once.
+    """
+    token = _similarity_cache.set({})
+    try:
+        yield
+    finally:
+        _similarity_cache.reset(token)
+
+
+def normalize(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Returns the vectors as a float32 matrix with unit-length rows."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def similarity_matrix(
+    ids: Sequence[str], vectors: Sequence[Sequence[float]]
+) -> np.ndarray:
+    """
+    Returns the N x N cosine similarity matrix of the vectors, computed in a
+    single matrix product and cached per request by the ids it was built from.
+    """
+    cache = _similarity_cache.get()
+    key = tuple(ids)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    matrix = normalize(vectors)
+    similarities = matrix @ matrix.T
+
+    if cache is not None:
+        cache[key] = similarities
+    return similarities
+
+
+def mmr(
+    relevance: np.ndarray, similarities: np.ndarray, k: int, lambda_: float
+) -> List[int]:
+    """
+    Selects k candidates by Maximal Marginal Relevance.
+
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity to the picks so far.
+    The max similarity is kept as a running vector updated with one row of the
+    similarity matrix per pick, so selection is O(N * k) after the matrix.
+
+    Args:
+        relevance (np.ndarray): Relevance of each of the N candidates to the query.
+        similarities (np.ndarray): N x N similarity matrix of the candidates.
+        k (int): The number of candidates to select.
+        lambda_ (float): Trade-off between relevance (1.0) and diversity (0.0).
+
+    Returns:
+        List[int]: Indices of the selected candidates, in selection order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    for _ in range(k):
+        if selected:
+            scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        np.maximum(max_similarity, similarities[index], out=max_similarity)
+
+    return selected
+
+
+def top_k_neighbours(
+    matrix: np.ndarray, k: int, threshold: float, block_size: int = 1024
+) -> List[Tuple[int, int, float]]:
+    """
+    Finds, for every row of a unit-length matrix, its k most similar other rows
+    with a similarity of at least threshold.
+
+    Rows are processed in blocks so only a block_size x N slice of the
+    similarity matrix exists at a time, and argpartition keeps the selection
+    O(N) per row, for O(N * k) output overall.
+
+    Returns:
+        List[Tuple[int, int, float]]: (row, neighbour, similarity) triples.
+    """
+    n = len(matrix)
+    k = min(k, n - 1)
+    if k <= 0:
+        return []
+
+    neighbours = []
+    for start in range(0, n, block_size):
+        similarities = matrix[start : start + block_size] @ matrix.T
+        rows = np.arange(similarities.shape[0])
+        similarities[rows, rows + start] = -np.inf
+
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = similarities[rows[:, np.newaxis], candidates]
+        for row, column in zip(*np.nonzero(scores >= threshold)):
+            neighbours.append(
+                (
+                    start + int(row),
+                    int(candidates[row, column]),
+                    float(scores[row, column]),
+                )
+            )
+
+    return neighbours
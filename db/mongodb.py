@@ -1,8 +1,12 @@
+import pymongo
 from pymongo import MongoClient, ReturnDocument
 from bson.objectid import ObjectId
 from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
 from core.config import settings
-from typing import List, Dict, Any
+from core.governor import governor, DeadlineExceededError
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator
 
 
 class MongoDBClient:
@@ -13,5 +17,24 @@ class MongoDBClient:
     def get_collection(self, collection_name: str) -> Collection:
         return self.db[collection_name]
 
+    @contextmanager
+    def guarded(self) -> Iterator[None]:
+        """
+        Admits a MongoDB operation through the governor and bounds it by the
+        remaining deadline of the current tool call. Running out of that time
+        is raised as a DeadlineExceededError, like a call shed waiting for its slot.
+        """
+        with governor.limit("mongodb"):
+            remaining = governor.remaining()
+            try:
+                with pymongo.timeout(
+                    max(remaining, 0.001) if remaining is not None else None
+                ):
+                    yield
+            except PyMongoError as e:
+                if remaining is None or not e.timeout:
+                    raise
+                raise DeadlineExceededError(f"MongoDB call timed out: {e}") from e
+
 
 client = MongoDBClient()
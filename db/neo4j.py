@@ -1,9 +1,23 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query
+from neo4j.exceptions import Neo4jError
 from core.config import settings
+from core.governor import governor, DeadlineExceededError
+from contextlib import contextmanager
 from neo4j import Record, Session
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, TypeVar
+from models.records import (
+    SourceRecord,
+    ConnectionRecord,
+    SOURCE_COLUMNS,
+    CONNECTION_COLUMNS,
+)
+import re
 import sys
 
+RELATIONSHIP_TYPE_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+T = TypeVar("T")
+
 
 class Neo4jClient:
     def __init__(self) -> None:
@@ -21,16 +35,75 @@ class Neo4jClient:
     def verify_connectivity(self) -> None:
         self.driver.verify_connectivity()
 
+    def create_indexes(self) -> None:
+        """
+        Creates the indexes the reconciler's (updated, sourceId) scan and
+        sourceId lookups rely on, if they don't exist yet.
+        """
+        with self.driver.session() as session:
+            session.run(
+                "CREATE INDEX source_updated IF NOT EXISTS FOR (s:source) ON (s.updated)"
+            )
+            session.run(
+                "CREATE INDEX source_source_id IF NOT EXISTS FOR (s:source) ON (s.sourceId)"
+            )
+
     def session(self) -> Session:
         return self.driver.session()
 
+    @staticmethod
+    def with_deadline(query: str) -> Query:
+        # propagate the tool call's deadline as a server-side transaction timeout
+        remaining = governor.remaining()
+        if remaining is None:
+            return query
+        return Query(query, timeout=max(remaining, 0.001))
+
+    @contextmanager
+    def guarded(self) -> Iterator[Session]:
+        """
+        Admits a Neo4j session through the governor. A transaction that runs
+        past the timeout set by `with_deadline` is raised as a
+        DeadlineExceededError, like a call shed waiting for its slot.
+        """
+        with governor.limit("neo4j"), self.driver.session() as session:
+            try:
+                yield session
+            except Neo4jError as e:
+                if e.code is None or "TransactionTimedOut" not in e.code:
+                    raise
+                raise DeadlineExceededError(f"Neo4j transaction timed out: {e}") from e
+
     def execute_query(
         self, query: str, parameters: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
-        with self.driver.session() as session:
-            result = session.run(query, parameters)
+        with self.guarded() as session:
+            result = session.run(self.with_deadline(query), parameters)
             return [record.data() for record in result]
 
+    def fetch_records(
+        self, query: str, parameters: Dict[str, Any], record_type: Callable[..., T]
+    ) -> List[T]:
+        """
+        Runs a query and unpacks each record's values, in column order, straight
+        into `record_type`, skipping the dict that `record.data()` would build.
+        """
+        with self.guarded() as session:
+            result = session.run(self.with_deadline(query), parameters)
+            return [record_type(*record) for record in result]
+
+    def stream_query(
+        self, query: str, parameters: Dict[str, Any] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Runs a query and yields its records lazily. The driver pulls records
+        from the server in batches of its fetch size, so memory use stays
+        constant however many records the query returns.
+        """
+        with governor.limit("neo4j"), self.driver.session() as session:
+            for record in session.run(query, parameters):
+                yield record.data()
+
     def create_node(self, label: str, properties: dict) -> Dict[str, Any]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
@@ -101,37 +174,13 @@ class Neo4jClient:
         )
         created_nodes = []
 
-        with self.driver.session() as session:
+        with governor.limit("neo4j"), self.driver.session() as session:
             result = session.run(query_template, {"props": nodes})
             for record in result:
                 created_nodes.append(record["n"])
 
         return created_nodes
 
-    @staticmethod
-    def serialize_source(source: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "sourceId": source["sourceId"],
-            "userId": source["userId"],
-            "name": source["name"],
-            "url": source.get("url") or None,
-            "content": source["content"],
-            "webId": source["webId"],
-            "created": source["created"],
-            "updated": source["updated"],
-            "size": source.get("size") or None,
-        }
-
-    @staticmethod
-    def serialize_connection(connection: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "id": connection["id"],
-            "sourceId": connection["sourceId"],
-            "targetId": connection["targetId"],
-            "created": connection["created"],
-            "updated": connection["updated"],
-        }
-
     def delete_relationship(
         self, start_node_id: int, end_node_id: int, relationship_type: str
     ) -> bool:
@@ -191,104 +240,272 @@ class Neo4jClient:
         return result[0]["r"] if result else None
 
     # spydr specific methods
-    def get_all_sources_for_web(self, label: str, web_id: str) -> List[Dict[str, Any]]:
+    def get_all_sources_for_web(self, label: str, web_id: str) -> List[SourceRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        sources_query = """
+        sources_query = f"""
         MATCH (s:source)
         WHERE s.webId=$web_id
-        RETURN s {.*, created: toString(s.created), updated: toString(s.updated), size: toInteger(s.size) }
+        RETURN {SOURCE_COLUMNS}
         """
 
         params = {"web_id": web_id}
-        sources_result = self.execute_query(sources_query, params)
-        sources = [source["s"] for source in sources_result]
-        return sources
+        return self.fetch_records(sources_query, params, SourceRecord)
+
+    def create_source(self, source: SourceRecord) -> SourceRecord:
+        query = f"""
+        CREATE (s:source $props)
+        RETURN {SOURCE_COLUMNS}
+        """
+        result = self.fetch_records(
+            query, {"props": source.as_properties()}, SourceRecord
+        )
+        return result[0] if result else None
+
+    def get_source_records_by_ids(self, source_ids: List[str]) -> List[SourceRecord]:
+        query = f"""
+        MATCH (s:source)
+        WHERE s.sourceId IN $source_ids
+        RETURN {SOURCE_COLUMNS}
+        """
+        return self.fetch_records(query, {"source_ids": source_ids}, SourceRecord)
+
+    def get_source_ids_updated_since(
+        self, updated: Any, source_id: str, until: Any, limit: int
+    ) -> List[Tuple[str, Any]]:
+        """
+        Pages through sources updated before `until` in (updated, sourceId)
+        order, starting after the given cursor.
+
+        Returns:
+            List[Tuple[str, Any]]: (sourceId, updated) pairs, at most `limit`.
+        """
+        query = """
+        MATCH (s:source)
+        WHERE (s.updated > $updated OR (s.updated = $updated AND s.sourceId > $source_id))
+          AND s.updated < $until
+        RETURN s.sourceId, s.updated
+        ORDER BY s.updated, s.sourceId
+        LIMIT $limit
+        """
+        params = {
+            "updated": updated,
+            "source_id": source_id,
+            "until": until,
+            "limit": limit,
+        }
+        return self.fetch_records(query, params, lambda *values: values)
+
+    def stream_sources_for_web(self, web_id: str) -> Iterator[Dict[str, Any]]:
+        query = """
+        MATCH (s:source)
+        WHERE s.webId=$web_id
+        RETURN s {.*} AS s
+        """
+        for record in self.stream_query(query, {"web_id": web_id}):
+            yield record["s"]
+
+    def stream_source_ids_for_web(self, web_id: str) -> Iterator[str]:
+        query = """
+        MATCH (s:source)
+        WHERE s.webId=$web_id
+        RETURN s.sourceId AS sourceId
+        """
+        for record in self.stream_query(query, {"web_id": web_id}):
+            yield record["sourceId"]
+
+    def stream_connections_for_web(self, web_id: str) -> Iterator[Dict[str, Any]]:
+        query = """
+        MATCH (s:source)-[c]->(t:source)
+        WHERE s.webId=$web_id
+        RETURN type(c) AS type, s.sourceId AS sourceId, t.sourceId AS targetId, c {.*} AS properties
+        """
+        yield from self.stream_query(query, {"web_id": web_id})
+
+    def merge_many_sources(self, sources: List[Dict[str, Any]]) -> List[str]:
+        """
+        Merges sources on sourceId, overwriting the properties of existing ones.
+
+        Returns:
+            List[str]: The IDs of the sources that did not exist before.
+        """
+        query = """
+        UNWIND $sources AS props
+        OPTIONAL MATCH (existing:source {sourceId: props.sourceId})
+        WITH props, existing IS NULL AS created
+        MERGE (s:source {sourceId: props.sourceId})
+        SET s = props
+        WITH s, created
+        WHERE created
+        RETURN s.sourceId AS sourceId
+        """
+        result = self.execute_query(query, {"sources": sources})
+        return [record["sourceId"] for record in result]
+
+    def merge_many_connections(
+        self, connections: List[Dict[str, Any]]
+    ) -> Tuple[int, int]:
+        """
+        Merges connections given as {type, sourceId, targetId, properties} rows
+        on their connectionId (or `id` for older connections), so parallel
+        connections between the same sources stay distinct. One UNWIND write is
+        made per relationship type. Connections with neither ID are skipped.
+
+        Returns:
+            Tuple[int, int]: The number of connections merged and skipped.
+        """
+        by_key: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        skipped = 0
+        for connection in connections:
+            properties = connection["properties"]
+            key = next(
+                (name for name in ("connectionId", "id") if properties.get(name)),
+                None,
+            )
+            if key is None:
+                print(
+                    f"Skipping connection without an ID: {connection['sourceId']} -> {connection['targetId']}",
+                    file=sys.stderr,
+                )
+                skipped += 1
+                continue
+            by_key.setdefault((connection["type"], key), []).append(connection)
+
+        merged = 0
+        for (relationship_type, key), rows in by_key.items():
+            if not RELATIONSHIP_TYPE_PATTERN.match(relationship_type):
+                raise ValueError(f"Unsupported relationship type: {relationship_type}")
+
+            query = f"""
+            UNWIND $rows AS row
+            MATCH (s:source {{sourceId: row.sourceId}})
+            MATCH (t:source {{sourceId: row.targetId}})
+            MERGE (s)-[c:{relationship_type} {{{key}: row.properties.{key}}}]->(t)
+            SET c = row.properties
+            RETURN count(c) AS merged_count
+            """
+            result = self.execute_query(query, {"rows": rows})
+            merged += result[0]["merged_count"] if result else 0
+        return merged, skipped
+
+    def create_many_connections(self, connections: List[Dict[str, Any]]) -> int:
+        """
+        Creates `connection` edges given as {sourceId, targetId, properties}
+        rows in a single UNWIND write.
+        """
+        if not connections:
+            return 0
+
+        query = """
+        UNWIND $rows AS row
+        MATCH (s:source {sourceId: row.sourceId})
+        MATCH (t:source {sourceId: row.targetId})
+        CREATE (s)-[c:connection]->(t)
+        SET c = row.properties, c.created = datetime(), c.updated = datetime()
+        RETURN count(c) AS created_count
+        """
+        result = self.execute_query(query, {"rows": connections})
+        return result[0]["created_count"] if result else 0
+
+    def get_ai_connection_ids_for_web(self, web_id: str) -> List[str]:
+        query = """
+        MATCH (s:source)-[c:connection]->(t:source)
+        WHERE s.webId=$web_id AND c.aiGenerated = true
+        RETURN c.connectionId AS connectionId
+        """
+        result = self.execute_query(query, {"web_id": web_id})
+        return [record["connectionId"] for record in result]
+
+    def delete_connections_for_web(
+        self, web_id: str, connection_ids: List[str]
+    ) -> int:
+        query = """
+        MATCH (s:source)-[c:connection]->(t:source)
+        WHERE s.webId=$web_id AND c.connectionId IN $connection_ids
+        DELETE c
+        RETURN count(c) AS deleted_count
+        """
+        result = self.execute_query(
+            query, {"web_id": web_id, "connection_ids": connection_ids}
+        )
+        return result[0]["deleted_count"] if result else 0
 
     def get_all_connections_for_web(
         self, label: str, web_id: str
-    ) -> List[Dict[str, Any]]:
+    ) -> List[ConnectionRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        connections_query = """
+        connections_query = f"""
         MATCH (s:source)-[c]->(t:source)
         WHERE s.webId=$web_id
-        RETURN c {.*, created: toString(c.created), updated: toString(c.updated)}
+        RETURN {CONNECTION_COLUMNS}
         """
 
         params = {"web_id": web_id}
-        connections_result = self.execute_query(connections_query, params)
-        connections = [connection["c"] for connection in connections_result]
-        return connections
+        return self.fetch_records(connections_query, params, ConnectionRecord)
 
     def get_outgoing_connections_for_source(
         self, label: str, source_id: str
-    ) -> List[Dict[str, Any]]:
+    ) -> List[ConnectionRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        connections_query = """
+        connections_query = f"""
         MATCH (s:source)-[c]->(t:source)
         WHERE c.fromSourceId=$source_id
+        RETURN {CONNECTION_COLUMNS}
         ORDER BY c.updated DESC
-        RETURN c {.*, created: toString(c.created), updated: toString(c.updated)}
         """
 
         params = {"source_id": source_id}
-        connections_result = self.execute_query(connections_query, params)
-        connections = [connection["c"] for connection in connections_result]
-
-        return connections
+        return self.fetch_records(connections_query, params, ConnectionRecord)
 
     def get_incoming_connections_for_source(
         self, label: str, source_id: str
-    ) -> List[Dict[str, Any]]:
+    ) -> List[ConnectionRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        connections_query = """
+        connections_query = f"""
         MATCH (s:source)-[c]->(t:source)
         WHERE c.toSourceId=$source_id
+        RETURN {CONNECTION_COLUMNS}
         ORDER BY c.updated DESC
-        RETURN c {.*, created: toString(c.created), updated: toString(c.updated)}
         """
 
         params = {"source_id": source_id}
-        connections_result = self.execute_query(connections_query, params)
-        connections = [connection["c"] for connection in connections_result]
+        return self.fetch_records(connections_query, params, ConnectionRecord)
 
-        return connections
-
-    def get_connection_by_id(self, label: str, connection_id: str) -> Dict[str, Any]:
+    def get_connection_by_id(
+        self, label: str, connection_id: str
+    ) -> Optional[ConnectionRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        connections_query = """
+        connections_query = f"""
         MATCH (s:source)-[c]->(t:source)
         WHERE c.connectionId=$connection_id
-        RETURN c {.*, created: toString(c.created), updated: toString(c.updated)}
+        RETURN {CONNECTION_COLUMNS}
         """
 
         params = {"connection_id": connection_id}
-        connections_result = self.execute_query(connections_query, params)
-        connections = [connection["c"] for connection in connections_result]
-
-        return connections
+        connections = self.fetch_records(connections_query, params, ConnectionRecord)
+        return connections[0] if connections else None
 
     def create_connection_between_sources(
         self,
         start_node_id: int,
         end_node_id: int,
         properties: Dict[str, Any] = None,
-    ) -> Dict[str, Any]:
+    ) -> Optional[ConnectionRecord]:
 
-        query = """
-        MATCH (s:source {sourceId: $start_id})
-        MATCH (t:source {sourceId: $end_id})
+        query = f"""
+        MATCH (s:source {{sourceId: $start_id}})
+        MATCH (t:source {{sourceId: $end_id}})
         CREATE (s)-[c:connection $props]->(t)
-        RETURN c {.*, created: toString(c.created), updated: toString(c.updated)}
+        RETURN {CONNECTION_COLUMNS}
         """
         params = {
             "start_id": start_node_id,
@@ -296,11 +513,11 @@ class Neo4jClient:
             "props": properties or {},
         }
         try:
-            result = self.execute_query(query, params)
+            result = self.fetch_records(query, params, ConnectionRecord)
         except Exception:
             print("Error creating conntection", file=sys.stderr)
         finally:
-            return result[0]["c"] if result else None
+            return result[0] if result else None
 
     def update_connection(
         self,
@@ -335,20 +552,19 @@ class Neo4jClient:
         self.execute_query(query, params)
         return True
 
-    def get_source_by_id(self, label: str, source_id: str) -> Dict[str, Any]:
+    def get_source_by_id(self, label: str, source_id: str) -> Optional[SourceRecord]:
         if label not in self.supported_labels:
             raise ValueError(f"Unsupported label: {label}")
 
-        sources_query = """
+        sources_query = f"""
         MATCH (s:source)
         WHERE s.sourceId=$source_id
-        RETURN s {.*, created: toString(s.created), updated: toString(s.updated)}
+        RETURN {SOURCE_COLUMNS}
         """
 
         params = {"source_id": source_id}
-        sources_result = self.execute_query(sources_query, params)
-        sources = [source["s"] for source in sources_result]
-        return sources[0]
+        sources = self.fetch_records(sources_query, params, SourceRecord)
+        return sources[0] if sources else None
 
     def update_source(
         self, source_id: int, properties: Dict[str, Any]
@@ -1,18 +1,74 @@
 from pinecone import Pinecone
+from urllib3.exceptions import MaxRetryError, TimeoutError as RequestTimeoutError
 from core.config import settings
+from core.governor import governor, DeadlineExceededError
+from core.cache import cache
+from core.sparse import BM25Encoder, hybrid_scale
+from core.vectors import mmr, similarity_matrix
+from contextlib import contextmanager
 from datetime import datetime
 from pytz import UTC
-from typing import Dict, Any, Literal, Optional
+from typing import Dict, Any, Iterator, List, Literal, Optional, Tuple
+import numpy as np
 import re
 import json
+import hashlib
 import sys
 import time
 
+# Pinecone caps metadata at 40KB per vector, so only a prefix of the content is kept
+MAX_METADATA_CONTENT = 8000
+# ids per fetch request, kept low so the request URL stays short
+FETCH_BATCH_SIZE = 100
+
 
 class PineconeClient:
     def __init__(self):
         self.client = Pinecone(api_key=settings.pinecone_api_key)
         self.index = self.client.Index(name=settings.pinecone_index_name)
+        self.sparse_encoder = BM25Encoder()
+        self.sparse_enabled: Optional[bool] = None
+
+    def supports_sparse(self) -> bool:
+        """
+        Whether the index accepts sparse values. Pinecone only allows them on
+        dotproduct indexes, so on any other metric sources are upserted and
+        searched with their dense vectors alone. Checked once per process.
+        """
+        if self.sparse_enabled is None:
+            metric = self.client.describe_index(settings.pinecone_index_name).metric
+            self.sparse_enabled = metric == "dotproduct"
+            if not self.sparse_enabled:
+                print(
+                    f"Index metric is {metric}, not dotproduct: hybrid search is disabled",
+                    file=sys.stderr,
+                )
+        return self.sparse_enabled
+
+    @contextmanager
+    def guarded(self, backend: str) -> Iterator[Dict[str, Any]]:
+        """
+        Admits an index call through the governor and yields the request
+        options that bound it by the remaining deadline of the current tool
+        call. Running out of that time is raised as a DeadlineExceededError.
+
+        Inference calls only wait for their slot under the deadline: the SDK's
+        `inference.embed` takes no request options. A late embedding still
+        fails the next governed call, which checks the deadline first.
+        """
+        with governor.limit(backend):
+            remaining = governor.remaining()
+            if remaining is None:
+                yield {}
+                return
+            try:
+                yield {"_request_timeout": max(remaining, 0.001)}
+            except (RequestTimeoutError, MaxRetryError) as e:
+                if isinstance(e, MaxRetryError) and not isinstance(
+                    e.reason, RequestTimeoutError
+                ):
+                    raise
+                raise DeadlineExceededError(f"Pinecone call timed out: {e}") from e
 
     def get_query_embedding(self, query: str):
         """
@@ -25,14 +81,141 @@ class PineconeClient:
         Returns:
             List[float]: A list of float values representing the embedding of the query.
         """
-        embedding = self.client.inference.embed(
-            model="multilingual-e5-large",
-            inputs=[query],
-            parameters={"input_type": "query"},
-        )
-        
+        key = f"embedding:multilingual-e5-large:query:{hashlib.sha256(query.encode()).hexdigest()}"
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        with governor.limit("pinecone_inference"):
+            embedding = self.client.inference.embed(
+                model="multilingual-e5-large",
+                inputs=[query],
+                parameters={"input_type": "query"},
+            )
+
+        values = list(embedding[0].values)
+        cache.set(key, values, settings.embedding_cache_ttl_seconds)
+        return values
+
+    def get_passage_embedding(self, passage: str) -> List[float]:
+        """
+        Generate a vector embedding for a passage (a source's text) using the
+        Pinecone multilingual-e5-large model. Passages longer than the model's
+        input window are truncated at the end.
+
+        Args:
+            passage (str): The passage to generate an embedding for.
+
+        Returns:
+            List[float]: A list of float values representing the embedding of the passage.
+        """
+        with governor.limit("pinecone_inference"):
+            embedding = self.client.inference.embed(
+                model="multilingual-e5-large",
+                inputs=[passage],
+                parameters={"input_type": "passage", "truncate": "END"},
+            )
+
         return embedding[0].values
 
+    def upsert_source(
+        self, source: Dict[str, Any]
+    ) -> Tuple[Dict[int, int], List[float]]:
+        """
+        Embeds a source and upserts it into the "sources" namespace with both
+        its dense vector and, on a dotproduct index, its BM25 sparse values.
+        The source is added to the vocabulary statistics after the upsert.
+
+        Args:
+            source (Dict[str, Any]): The source properties, as stored in Neo4j.
+
+        Returns:
+            Tuple[Dict[int, int], List[float]]: The term counts added to the vocabulary
+                statistics, so the caller can persist them, and the dense embedding.
+        """
+        text = f"{source['name']}\n{source.get('content') or ''}"
+        sparse_values = self.sparse_encoder.encode_document(text)
+
+        vector = {
+            "id": source["sourceId"],
+            "values": self.get_passage_embedding(text),
+            "metadata": {
+                "sourceId": source["sourceId"],
+                "webId": source["webId"],
+                "userId": source["userId"],
+                "name": source["name"],
+                "type": source.get("type") or "",
+                "content": (source.get("content") or "")[:MAX_METADATA_CONTENT],
+            },
+        }
+        if sparse_values["indices"] and self.supports_sparse():
+            vector["sparse_values"] = sparse_values
+
+        with self.guarded("pinecone_query") as options:
+            self.index.upsert(vectors=[vector], namespace="sources", **options)
+
+        # only counted once the upsert succeeded, so a failed or shed ingest
+        # doesn't leave this worker's statistics ahead of sparseStats
+        term_counts = self.sparse_encoder.add_document(text)
+        return term_counts, vector["values"]
+
+    def query_similar_sources(
+        self, vector: List[float], web_id: str, limit: int
+    ) -> List[Tuple[str, float]]:
+        """
+        Finds the sources of a web whose dense vectors are closest to the given one.
+
+        Returns:
+            List[Tuple[str, float]]: (sourceId, score) pairs, best first.
+        """
+        with self.guarded("pinecone_query") as options:
+            pinecone_response = self.index.query(
+                vector=vector,
+                top_k=limit,
+                namespace="sources",
+                filter={"webId": web_id},
+                **options,
+            )
+        return [(match["id"], match["score"]) for match in pinecone_response["matches"]]
+
+    def fetch_vectors(self, ids: List[str], namespace: str) -> Dict[str, Any]:
+        """
+        Fetches stored vectors (values, sparse values and metadata) by ID, in
+        requests of at most FETCH_BATCH_SIZE IDs.
+
+        Returns:
+            Dict[str, Vector]: The vectors found, keyed by ID. Missing IDs are left out.
+        """
+        vectors = {}
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            with self.guarded("pinecone_query") as options:
+                vectors.update(
+                    self.index.fetch(
+                        ids=ids[start : start + FETCH_BATCH_SIZE],
+                        namespace=namespace,
+                        **options,
+                    ).vectors
+                )
+        return vectors
+
+    def upsert_vectors(self, vectors: List[Dict[str, Any]], namespace: str) -> None:
+        for start in range(0, len(vectors), FETCH_BATCH_SIZE):
+            with self.guarded("pinecone_query") as options:
+                self.index.upsert(
+                    vectors=vectors[start : start + FETCH_BATCH_SIZE],
+                    namespace=namespace,
+                    **options,
+                )
+
+    def delete_vectors(self, ids: List[str], namespace: str) -> None:
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            with self.guarded("pinecone_query") as options:
+                self.index.delete(
+                    ids=ids[start : start + FETCH_BATCH_SIZE],
+                    namespace=namespace,
+                    **options,
+                )
+
     def run_semantic_web_search(
         self, query: str, filter: Dict[str, Any] = {}, limit: int = 10
     ):
@@ -49,13 +232,15 @@ class PineconeClient:
             list: A list of dictionaries, each containing the metadata of a result, as well as its ID.
         """
         query_embedding = self.get_query_embedding(query)
-        pinecone_response = self.index.query(
-            vector=query_embedding,
-            top_k=limit,
-            include_metadata=True,
-            namespace="webs",
-            filter=filter,
-        )
+        with self.guarded("pinecone_query") as options:
+            pinecone_response = self.index.query(
+                vector=query_embedding,
+                top_k=limit,
+                include_metadata=True,
+                namespace="webs",
+                filter=filter,
+                **options,
+            )
         results = []
 
         for match in pinecone_response["matches"]:
@@ -66,17 +251,33 @@ class PineconeClient:
         return results
 
     def run_semantic_source_search(
-        self, query: str, filter: Dict[str, Any] = {}, limit: int = 10
+        self,
+        query: str,
+        filter: Dict[str, Any] = {},
+        limit: int = 10,
+        alpha: float = 1.0,
+        diversify: bool = False,
     ):
         """
         Runs a semantic search over the Pinecone index for a given web ID.
 
+        With alpha below 1 this is a hybrid search: the dense query embedding is
+        combined with a BM25 sparse query vector, so exact terms such as names,
+        error codes and URLs also count towards the score. Hybrid search needs
+        an index with the dotproduct metric; on any other index the search is
+        dense only whatever alpha is.
+
         Args:
         - webId (str): The ID of the web to search within.
         - query (str): The query string to search for.
         - limit (int): The maximum number of results to return.
         - filter (Dict[str, Any]): A filter to apply on the results. The filter should be a dictionary
             where each key is a metadata key and the value is a filter value.
+        - alpha (float): Weight of the dense score, between 0 and 1. The sparse score is weighted
+            by 1 - alpha. Defaults to 1.0 (dense only).
+        - diversify (bool): If True, over-fetches MMR_FETCH_K candidates and re-ranks them with
+            Maximal Marginal Relevance (MMR_LAMBDA) so near-duplicate sources don't take up
+            several of the limit slots. Defaults to False.
 
         Returns:
         - List[Dict[str, Any]]: A list of dictionaries, each representing a result. The dictionary will
@@ -86,23 +287,68 @@ class PineconeClient:
 
         print(f"Query embedding: {query_embedding}", file=sys.stderr)
 
-        pinecone_response = self.index.query(
-            vector=query_embedding,
-            top_k=limit,
-            include_metadata=True,
-            namespace="sources",
-            filter=filter,
-        )
+        sparse_vector = None
+        if alpha < 1 and self.supports_sparse():
+            sparse_vector = self.sparse_encoder.encode_query(query)
+            if sparse_vector["indices"]:
+                query_embedding, sparse_vector = hybrid_scale(
+                    query_embedding, sparse_vector, alpha
+                )
+            else:
+                sparse_vector = None
+
+        with self.guarded("pinecone_query") as options:
+            pinecone_response = self.index.query(
+                vector=query_embedding,
+                sparse_vector=sparse_vector,
+                top_k=max(limit, settings.mmr_fetch_k) if diversify else limit,
+                include_values=diversify,
+                include_metadata=True,
+                namespace="sources",
+                filter=filter,
+                **options,
+            )
+
+        matches = pinecone_response["matches"]
+        if diversify:
+            matches = self.rerank_matches(matches, limit)
+        else:
+            print(f"Pinecone response: {pinecone_response}", file=sys.stderr)
 
         results = []
-        print(f"Pinecone response: {pinecone_response}", file=sys.stderr)
 
-        for match in pinecone_response["matches"]:
+        for match in matches:
             result = match["metadata"]
             result["id"] = match["id"]
             results.append(result)
-        
+
         return results
 
+    @staticmethod
+    def rerank_matches(matches: List[Any], limit: int) -> List[Any]:
+        """
+        Picks `limit` diverse matches out of an over-fetched candidate set with
+        Maximal Marginal Relevance. Pinecone's score is used as the relevance
+        (so hybrid scores carry over) and the candidates' dense values for the
+        similarity between candidates.
+        """
+        if len(matches) <= limit:
+            return list(matches)
+
+        similarities = similarity_matrix(
+            [match["id"] for match in matches], [match["values"] for match in matches]
+        )
+        selected = mmr(
+            np.array([match["score"] for match in matches], dtype=np.float32),
+            similarities,
+            limit,
+            settings.mmr_lambda,
+        )
+        print(
+            f"MMR re-ranked {len(matches)} candidates to {[matches[i]['id'] for i in selected]}",
+            file=sys.stderr,
+        )
+        return [matches[i] for i in selected]
+
 
 client = PineconeClient()
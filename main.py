@@ -1,7 +1,17 @@
 from mcp.server.fastmcp import FastMCP, Context
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 from contextlib import asynccontextmanager
 from collections.abc import AsyncIterator
 from models.source import CreateSource, create_source
+from core.governor import governor, OverloadedError, DeadlineExceededError
+from core.config import settings
+from core.vectors import similarity_cache
+from core.cache import cache
+from core.encoding import dumps
+from models.sparse import load_sparse_stats
+from models.reconciler import reconciler, create_indexes
 from db.index import (
     mongoDBClient,
     pineconeClient,
@@ -11,10 +21,17 @@ from db.index import (
     Neo4jClient,
 )
 import sys
+import asyncio
+import hashlib
+import argparse
 import traceback
+import anyio
+import uvicorn
 from dataclasses import dataclass
+from typing import Optional
 
-# uv run mcp install main.py --with pymongo --with neo4j --with pinecone --with pydantic-settings --with pydantic --with python-dotenv
+# uv run mcp install main.py --with pymongo --with neo4j --with pinecone --with pydantic-settings --with pydantic --with python-dotenv --with numpy --with msgpack
+# uv run python main.py --transport http --workers 4
 
 @dataclass
 class AppContext:
@@ -23,6 +40,62 @@ class AppContext:
     neo4j: Neo4jClient
 
 
+@dataclass
+class ServerState:
+    # set when the HTTP process lifespan owns the database connections, so the
+    # per-session app_lifespan must neither reconnect nor close them
+    shared_connections: bool = False
+    ready: bool = False
+    reconciler_task: Optional[asyncio.Task] = None
+
+
+state = ServerState()
+
+
+async def run_reconciler() -> None:
+    while True:
+        try:
+            await anyio.to_thread.run_sync(reconciler.run_once)
+        except Exception as e:
+            print(f"ERROR running reconciler: {e}", file=sys.stderr)
+        await asyncio.sleep(settings.reconciler_interval_seconds)
+
+
+def start_reconciler() -> None:
+    if settings.reconciler_enabled:
+        state.reconciler_task = asyncio.create_task(run_reconciler())
+
+
+def stop_reconciler() -> None:
+    # the current batch finishes in its thread, then the run stops
+    reconciler.stop()
+    if state.reconciler_task is not None:
+        state.reconciler_task.cancel()
+        state.reconciler_task = None
+
+
+def connect_databases() -> None:
+    print("Initializing server and connecting to databases..", file=sys.stderr)
+
+    mongoDBClient.client.server_info()
+    pineconeClient.client.list_indexes()
+    neo4jClient.verify_connectivity()
+
+    print("Successfully connected to databases!", file=sys.stderr)
+    create_indexes()
+    load_sparse_stats(pineconeClient.sparse_encoder)
+    pineconeClient.supports_sparse()
+    state.ready = True
+
+
+def disconnect_databases() -> None:
+    state.ready = False
+    print("Shutting down server and disconnecting from databases..", file=sys.stderr)
+    mongoDBClient.client.close()
+    neo4jClient.close()
+    print("Successfully shut down server!", file=sys.stderr)
+
+
 @asynccontextmanager
 async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
     """
@@ -36,16 +109,20 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
     After the error is caught, or if no error occurred, the finally block is
     executed to clean up the server and databases.
 
-    """
-    try:
+    Over HTTP this runs for every session, so the connections are owned by
+    `http_lifespan` instead and are only handed out here.
 
-        print("Initializing server and connecting to databases..", file=sys.stderr)
+    """
+    if state.shared_connections:
+        yield AppContext(
+            mongdb=mongoDBClient, pinecone=pineconeClient, neo4j=neo4jClient
+        )
+        return
 
-        mongoDBClient.client.server_info()
-        pineconeClient.client.list_indexes()
-        neo4jClient.verify_connectivity()
+    try:
 
-        print("Successfully connected to databases!", file=sys.stderr)
+        connect_databases()
+        start_reconciler()
         print("Starting server..", file=sys.stderr)
         yield AppContext(
             mongdb=mongoDBClient, pinecone=pineconeClient, neo4j=neo4jClient
@@ -57,12 +134,8 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
 
     finally:
         # cleanup on shutdown
-        print(
-            "Shutting down server and disconnecting from databases..", file=sys.stderr
-        )
-        mongoDBClient.client.close()
-        neo4jClient.close()
-        print("Successfully shut down server!", file=sys.stderr)
+        stop_reconciler()
+        disconnect_databases()
 
 
 mcp = FastMCP(
@@ -77,6 +150,8 @@ mcp = FastMCP(
         "pydantic-settings",
         "pymongo",
         "python-dotenv",
+        "numpy",
+        "msgpack",
     ],
 )
 
@@ -85,7 +160,7 @@ WEB_ID_TO_TEST = "861539e5-d6aa-4a58-97d9-c19ee87475ec"
 
 
 @mcp.tool()
-def add_chat_to_memory(messages: list[str], summary: str) -> str:
+async def add_chat_to_memory(messages: list[str], summary: str) -> str:
     """
     Given a list of strings that represent a chat log, and a string for the summary,
     this tool creates a new source in the user's memory database with the given content
@@ -108,9 +183,16 @@ def add_chat_to_memory(messages: list[str], summary: str) -> str:
             type="note",
         )
         print(f"Creating source: {sourceToCreate}", file=sys.stderr)
-        source = create_source(sourceToCreate)
+        with governor.request(USER_ID_TO_TEST):
+            # blocking database calls run in a worker thread so the event loop
+            # keeps serving other sessions; the deadline contextvar is copied in
+            source = await anyio.to_thread.run_sync(create_source, sourceToCreate)
+
+        return f"Successfully added chat to memory: {dumps(source)} for user {USER_ID_TO_TEST} in web {WEB_ID_TO_TEST}"
 
-        return f"Successfully added chat to memory: {source} for user {USER_ID_TO_TEST} in web {WEB_ID_TO_TEST}"
+    except (OverloadedError, DeadlineExceededError) as e:
+        print(f"Shed add_chat_to_memory: {e}", file=sys.stderr)
+        return "Server is busy, please retry adding chat to memory shortly"
 
     except Exception as e:
         print(f"ERROR adding chat to memory: {e}", file=sys.stderr)
@@ -127,10 +209,45 @@ def get_config() -> str:
     """Static configuration data"""
     return "App configuration here"
 
+
+@mcp.resource("metrics://governor")
+def get_governor_metrics() -> str:
+    """In-flight, queued, rejected and timed out calls per backend"""
+    return dumps(governor.metrics())
+
+
+@mcp.resource("metrics://reconciler")
+def get_reconciler_metrics() -> str:
+    """Batches checked and drift repaired by the background reconciler"""
+    return dumps(reconciler.metrics())
+
+
+def search_query_context(query: str, k: int) -> list:
+    # the generation is bumped on every ingest, so cached results never go stale
+    generation = cache.get("sources:generation") or 0
+    key = hashlib.sha256(
+        dumps([query, k, settings.hybrid_alpha, generation]).encode()
+    ).hexdigest()
+
+    content = cache.get(f"results:{key}")
+    if content is None:
+        content = pineconeClient.run_semantic_source_search(
+            query=query,
+            limit=k,
+            filter={},
+            alpha=settings.hybrid_alpha,
+            diversify=True,
+        )
+        cache.set(f"results:{key}", content, settings.result_cache_ttl_seconds)
+    return content
+
+
 @mcp.tool()
-def get_query_context(query: str, k: int) -> str:
+async def get_query_context(query: str, k: int) -> str:
     """
     Given a query string, get the k most semantically relevant sources in the user's memory database.
+    Exact terms in the query (names, error codes, URLs) are matched as well as its meaning,
+    and near-duplicate sources are skipped in favour of diverse ones.
 
     The sources are filtered to only include those from the user's personal webs.
 
@@ -141,15 +258,90 @@ def get_query_context(query: str, k: int) -> str:
     Returns:
         str: A string containing the k most semantically relevant sources.
     """
-    content = pineconeClient.run_semantic_source_search(
-        query=query,
-        limit=k,
-        filter={},
-    )
-    print(f"Query context: {content}", file=sys.stderr)
-    return f"Query context: {content}"
+    try:
+        with governor.request(USER_ID_TO_TEST), similarity_cache():
+            content = await anyio.to_thread.run_sync(search_query_context, query, k)
+    except (OverloadedError, DeadlineExceededError) as e:
+        print(f"Shed get_query_context: {e}", file=sys.stderr)
+        return "Server is busy, please retry the query shortly"
+
+    response = dumps(content)
+    print(f"Query context: {response}", file=sys.stderr)
+    return f"Query context: {response}"
 
 
 @mcp.resource("neo4j://{cypher}")  # different traversals
 def get_graph_context(cypher: str) -> str:
-    pass
\ No newline at end of file
+    pass
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """Liveness: the worker process is up and serving requests."""
+    return JSONResponse({"status": "ok"})
+
+
+def ping_databases() -> None:
+    mongoDBClient.client.admin.command("ping")
+    neo4jClient.verify_connectivity()
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """Readiness: the databases were connected at startup and still answer."""
+    if not state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        await anyio.to_thread.run_sync(ping_databases)
+    except Exception as e:
+        return JSONResponse({"status": "unavailable", "error": str(e)}, status_code=503)
+    return JSONResponse({"status": "ready", "governor": governor.metrics()})
+
+
+@asynccontextmanager
+async def http_lifespan(app: Starlette) -> AsyncIterator[None]:
+    """
+    Process lifespan for the HTTP transport: connects the databases once per
+    worker, starts the reconciler, runs the MCP session manager, and closes
+    the connections when the worker shuts down.
+    """
+    state.shared_connections = True
+    await anyio.to_thread.run_sync(connect_databases)
+    start_reconciler()
+    try:
+        async with mcp.session_manager.run():
+            yield
+    finally:
+        stop_reconciler()
+        disconnect_databases()
+
+
+def http_app() -> Starlette:
+    """
+    Builds the streamable HTTP app for one worker. Sessions are stateless so
+    any worker can serve any request.
+    """
+    mcp.settings.stateless_http = True
+    app = mcp.streamable_http_app()
+    app.router.lifespan_context = http_lifespan
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the spydr MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument("--host", default=settings.http_host)
+    parser.add_argument("--port", type=int, default=settings.http_port)
+    parser.add_argument("--workers", type=int, default=settings.http_workers)
+    args = parser.parse_args()
+
+    if args.transport == "http":
+        uvicorn.run(
+            "main:http_app",
+            factory=True,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+        )
+    else:
+        mcp.run()
\ No newline at end of file
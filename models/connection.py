@@ -0,0 +1,243 @@
+"""
+Automatic connections for webs with `enableAIConnections`.
+
+When a source is ingested its dense vector is compared against the web's
+other sources in one pass: against a per-web matrix, loaded from Pinecone on
+the web's first ingest and kept current after that, or with a Pinecone query
+filtered to the web for webs too large to cache. The best
+candidates above the threshold become `connection` edges, created in a single
+UNWIND write and marked with `aiGenerated` so a rebuild can replace them.
+
+Usage:
+    python -m models.connection rebuild <webId>
+"""
+
+import numpy as np
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+from core.config import settings
+from core.vectors import normalize, top_k_neighbours
+from db.index import neo4jClient, pineconeClient
+
+BATCH_SIZE = 500
+
+
+class WebVectors:
+    def __init__(self, ids: List[str], matrix: np.ndarray) -> None:
+        self.ids = ids
+        self.matrix = matrix
+
+    def append(self, source_id: str, vector: np.ndarray) -> None:
+        self.ids.append(source_id)
+        if self.matrix.size:
+            self.matrix = np.vstack([self.matrix, vector])
+        else:
+            self.matrix = vector[np.newaxis, :]
+
+
+def fetch_web_vectors(web_id: str) -> WebVectors:
+    """Fetches all source vectors of a web from Pinecone as a unit-length matrix."""
+    return _web_vectors(list(neo4jClient.stream_source_ids_for_web(web_id)))
+
+
+def _web_vectors(ids: List[str]) -> WebVectors:
+    vectors = pineconeClient.fetch_vectors(ids, namespace="sources")
+    ids = [source_id for source_id in ids if source_id in vectors]
+    matrix = (
+        normalize([vectors[source_id].values for source_id in ids])
+        if ids
+        else np.empty((0, 0), dtype=np.float32)
+    )
+    return WebVectors(ids, matrix)
+
+
+class WebVectorCache:
+    """
+    LRU cache of per-web unit-length source vector matrices. Webs with more
+    than `max_sources` sources are not cached, so memory stays bounded.
+    """
+
+    def __init__(self, max_webs: int, max_sources: int) -> None:
+        self.max_webs = max_webs
+        self.max_sources = max_sources
+        self.webs: "OrderedDict[str, WebVectors]" = OrderedDict()
+        # webs found too large, so their source IDs aren't listed on every ingest
+        self.too_large: set = set()
+        self.lock = threading.Lock()
+
+    def get(self, web_id: str) -> Optional[WebVectors]:
+        with self.lock:
+            web = self.webs.get(web_id)
+            if web is not None:
+                self.webs.move_to_end(web_id)
+            return web
+
+    def put(self, web_id: str, web: WebVectors) -> None:
+        with self.lock:
+            self.webs[web_id] = web
+            self.webs.move_to_end(web_id)
+            while len(self.webs) > self.max_webs:
+                self.webs.popitem(last=False)
+
+    def get_or_load(self, web_id: str) -> Optional[WebVectors]:
+        """
+        Returns the cached vectors of a web, loading them from Pinecone on the
+        first call for the web. Returns None for webs too large to cache.
+        """
+        web = self.get(web_id)
+        if web is not None or web_id in self.too_large:
+            return web
+
+        ids = list(neo4jClient.stream_source_ids_for_web(web_id))
+        if len(ids) > self.max_sources:
+            with self.lock:
+                self.too_large.add(web_id)
+            return None
+        web = _web_vectors(ids)
+        self.put(web_id, web)
+        return web
+
+    def add(self, web_id: str, source_id: str, vector: np.ndarray) -> None:
+        # keeps a cached web current as sources are ingested
+        with self.lock:
+            web = self.webs.get(web_id)
+            if web is None or source_id in web.ids:
+                return
+            web.append(source_id, vector)
+            if len(web.ids) > self.max_sources:
+                del self.webs[web_id]
+                self.too_large.add(web_id)
+
+
+cache = WebVectorCache(
+    settings.ai_connection_cached_webs, settings.ai_connection_cache_max_sources
+)
+
+
+def _connection_row(
+    web_id: str, source_id: str, target_id: str, score: float
+) -> Dict[str, Any]:
+    return {
+        "sourceId": source_id,
+        "targetId": target_id,
+        "properties": {
+            "connectionId": str(uuid4()),
+            "fromSourceId": source_id,
+            "toSourceId": target_id,
+            "webId": web_id,
+            "score": score,
+            "aiGenerated": True,
+        },
+    }
+
+
+def suggest_connections(
+    web_id: str, source_id: str, vector: List[float]
+) -> List[Tuple[str, float]]:
+    """
+    Finds the sources of a web most similar to a newly ingested one.
+
+    Args:
+        web_id (str): The ID of the web the source belongs to.
+        source_id (str): The ID of the new source.
+        vector (List[float]): The new source's dense vector.
+
+    Returns:
+        List[Tuple[str, float]]: Up to AI_CONNECTION_MAX (sourceId, similarity)
+            pairs above AI_CONNECTION_THRESHOLD, best first.
+    """
+    web = cache.get_or_load(web_id)
+    if web is not None:
+        if not web.ids:
+            return []
+        similarities = web.matrix @ normalize(vector)[0]
+        candidates = [
+            (web.ids[i], float(similarities[i]))
+            for i in np.argsort(-similarities)[: settings.ai_connection_max + 1]
+        ]
+    else:
+        candidates = pineconeClient.query_similar_sources(
+            vector, web_id, settings.ai_connection_max + 1
+        )
+
+    return [
+        (candidate_id, score)
+        for candidate_id, score in candidates
+        if candidate_id != source_id and score >= settings.ai_connection_threshold
+    ][: settings.ai_connection_max]
+
+
+def connect_new_source(web_id: str, source_id: str, vector: List[float]) -> int:
+    """
+    Creates AI connections from a newly ingested source to its most similar
+    sources in the web, in a single write.
+
+    Returns:
+        int: The number of connections created.
+    """
+    suggestions = suggest_connections(web_id, source_id, vector)
+    cache.add(web_id, source_id, normalize(vector)[0])
+    created = neo4jClient.create_many_connections(
+        [
+            _connection_row(web_id, source_id, target_id, score)
+            for target_id, score in suggestions
+        ]
+    )
+    print(f"Created {created} AI connections for source {source_id}", file=sys.stderr)
+    return created
+
+
+def rebuild_connections_for_web(web_id: str) -> int:
+    """
+    Replaces all AI connections of a web. Every source is connected to its
+    most similar sources, found with a blocked matrix product over the web's
+    vectors, so the work is O(n * k) writes instead of pairwise round-trips.
+    Each similar pair gets one edge.
+
+    The new connections are created before the old ones are deleted by ID, so
+    a rebuild that fails part way leaves the web with its previous connections
+    rather than none. Connections created by ingests during the rebuild are
+    kept.
+
+    Returns:
+        int: The number of connections created.
+    """
+    old_ids = neo4jClient.get_ai_connection_ids_for_web(web_id)
+    web = fetch_web_vectors(web_id)
+
+    pairs = {}
+    for row, neighbour, score in top_k_neighbours(
+        web.matrix, settings.ai_connection_max, settings.ai_connection_threshold
+    ):
+        pairs.setdefault((min(row, neighbour), max(row, neighbour)), score)
+
+    rows = [
+        _connection_row(web_id, web.ids[i], web.ids[j], score)
+        for (i, j), score in pairs.items()
+    ]
+    created = 0
+    for start in range(0, len(rows), BATCH_SIZE):
+        created += neo4jClient.create_many_connections(rows[start : start + BATCH_SIZE])
+
+    deleted = 0
+    for start in range(0, len(old_ids), BATCH_SIZE):
+        deleted += neo4jClient.delete_connections_for_web(
+            web_id, old_ids[start : start + BATCH_SIZE]
+        )
+
+    print(
+        f"Rebuilt AI connections for web {web_id}: {deleted} deleted, {created} created",
+        file=sys.stderr,
+    )
+    return created
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "rebuild":
+        rebuild_connections_for_web(sys.argv[2])
+    else:
+        print(__doc__, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,347 @@
+"""
+Incremental consistency reconciler for Neo4j, MongoDB and Pinecone.
+
+Neo4j is the source of truth for sources. For every source ID it checks, the
+reconciler makes sure the source is listed in its web's `sourceIds` in Mongo
+and has a vector in Pinecone, and removes IDs that no longer exist in Neo4j
+from Mongo and Pinecone. Work is proportional to what changed, found by:
+
+    change log   sources whose writes failed part way (see log_source_change)
+    sources      Neo4j sources past the `updated` watermark
+    webs         Mongo webs past the `updated` watermark, for orphaned IDs
+
+Each pass pages with a cursor, repairs one batch at a time, and persists its
+watermark after every batch, so an interrupted run resumes where it stopped.
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from uuid import uuid4
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from neo4j.time import DateTime
+from core.config import settings
+from core.governor import TokenBucket
+from db.index import neo4jClient, pineconeClient, mongoDBClient
+from models.web import Webs
+from models.sparse import record_sparse_documents
+
+SourceChanges = mongoDBClient.get_collection("sourceChanges")
+ReconcilerState = mongoDBClient.get_collection("reconcilerState")
+
+EPOCH = datetime(1970, 1, 1)
+# sources this recent are left for the next run, so a source still being
+# written (or not yet visible in Pinecone) isn't "repaired" mid-write
+SETTLE_SECONDS = 60
+
+
+def log_source_change(source_id: str, web_id: str) -> None:
+    """Records a source whose writes may have left the stores out of sync."""
+    try:
+        SourceChanges.insert_one(
+            {"sourceId": source_id, "webId": web_id, "created": datetime.now()}
+        )
+    except Exception as e:
+        print(f"ERROR logging source change {source_id}: {e}", file=sys.stderr)
+
+
+def create_indexes() -> None:
+    """Creates the indexes behind the sources and webs passes' sorted scans."""
+    neo4jClient.create_indexes()
+    Webs.create_index([("updated", 1), ("webId", 1)])
+
+
+class Reconciler:
+    def __init__(
+        self, batch_size: int, batches_per_second: float, max_batches: int
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.bucket = TokenBucket(batches_per_second, 1)
+        self.owner = str(uuid4())
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.counters = {
+            "runs": 0,
+            "batches": 0,
+            "checked": 0,
+            "addedToWebs": 0,
+            "removedFromWebs": 0,
+            "reembedded": 0,
+            "deletedVectors": 0,
+            "errors": 0,
+        }
+        self.last_run: Dict[str, Any] = {}
+
+    def count(self, **increments: int) -> None:
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {**self.counters, "lastRun": self.last_run}
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def acquire_lease(self, seconds: float) -> bool:
+        """Makes sure only one process reconciles at a time."""
+        now = datetime.now()
+        try:
+            ReconcilerState.find_one_and_update(
+                {
+                    "_id": "lease",
+                    "$or": [{"owner": self.owner}, {"expires": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "expires": now + timedelta(seconds=seconds),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    @staticmethod
+    def get_watermark(name: str, default: Dict[str, Any]) -> Dict[str, Any]:
+        state = ReconcilerState.find_one({"_id": name})
+        return state["watermark"] if state else default
+
+    @staticmethod
+    def set_watermark(name: str, watermark: Dict[str, Any]) -> None:
+        ReconcilerState.update_one(
+            {"_id": name}, {"$set": {"watermark": watermark}}, upsert=True
+        )
+
+    def reconcile(self, source_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Checks a batch of source IDs in all three stores and repairs drift.
+
+        Returns:
+            Dict[str, List[str]]: The IDs removed from each web's `sourceIds`.
+        """
+        ids = list(dict.fromkeys(source_ids))
+        if not ids:
+            return {}
+
+        records = {
+            record.sourceId: record
+            for record in neo4jClient.get_source_records_by_ids(ids)
+        }
+        memberships: Dict[str, set] = {}
+        with mongoDBClient.guarded():
+            for web in Webs.aggregate(
+                [
+                    {"$match": {"sourceIds": {"$in": ids}}},
+                    {
+                        "$project": {
+                            "webId": 1,
+                            "sourceIds": {"$setIntersection": ["$sourceIds", ids]},
+                        }
+                    },
+                ]
+            ):
+                for source_id in web["sourceIds"]:
+                    memberships.setdefault(source_id, set()).add(web["webId"])
+        vectors = pineconeClient.fetch_vectors(ids, namespace="sources")
+
+        to_add: Dict[str, List[str]] = {}
+        to_remove: Dict[str, List[str]] = {}
+        to_embed = []
+        orphan_vectors = []
+        for source_id in ids:
+            record = records.get(source_id)
+            webs = memberships.get(source_id, set())
+            if record is None:
+                for web_id in webs:
+                    to_remove.setdefault(web_id, []).append(source_id)
+                if source_id in vectors:
+                    orphan_vectors.append(source_id)
+                continue
+            if record.webId not in webs:
+                to_add.setdefault(record.webId, []).append(source_id)
+            if source_id not in vectors:
+                to_embed.append(record)
+
+        operations = [
+            UpdateOne({"webId": web_id}, {"$addToSet": {"sourceIds": {"$each": added}}})
+            for web_id, added in to_add.items()
+        ] + [
+            UpdateOne({"webId": web_id}, {"$pullAll": {"sourceIds": removed}})
+            for web_id, removed in to_remove.items()
+        ]
+        if operations:
+            with mongoDBClient.guarded():
+                Webs.bulk_write(operations, ordered=False)
+
+        pineconeClient.delete_vectors(orphan_vectors, namespace="sources")
+        # sources are only counted in the BM25 statistics once their upsert
+        # succeeded, so one without a vector was never counted
+        record_sparse_documents(
+            [
+                pineconeClient.upsert_source(record.as_properties())[0]
+                for record in to_embed
+            ]
+        )
+
+        self.count(
+            batches=1,
+            checked=len(ids),
+            addedToWebs=sum(len(added) for added in to_add.values()),
+            removedFromWebs=sum(len(removed) for removed in to_remove.values()),
+            reembedded=len(to_embed),
+            deletedVectors=len(orphan_vectors),
+        )
+        return to_remove
+
+    def drain_change_log(self) -> bool:
+        entries = list(
+            SourceChanges.find({}, {"sourceId": 1})
+            .sort("_id", 1)
+            .limit(self.batch_size)
+        )
+        if not entries:
+            return False
+
+        self.reconcile([entry["sourceId"] for entry in entries])
+        SourceChanges.delete_many({"_id": {"$in": [entry["_id"] for entry in entries]}})
+        return len(entries) == self.batch_size
+
+    def scan_sources(self) -> bool:
+        watermark = self.get_watermark("sources", {"updated": EPOCH, "sourceId": ""})
+        updated = watermark["updated"]
+        if isinstance(updated, str):
+            updated = DateTime.from_iso_format(updated)
+        page = neo4jClient.get_source_ids_updated_since(
+            updated,
+            watermark["sourceId"],
+            datetime.now() - timedelta(seconds=SETTLE_SECONDS),
+            self.batch_size,
+        )
+        if not page:
+            return False
+
+        self.reconcile([source_id for source_id, _ in page])
+        source_id, updated = page[-1]
+        # kept as an ISO string: Neo4j times have nanoseconds and a BSON date
+        # only milliseconds, so a truncated watermark would fall behind the page
+        # and never get past a millisecond holding a full batch of sources
+        self.set_watermark(
+            "sources",
+            {
+                "updated": (
+                    updated.iso_format() if hasattr(updated, "iso_format") else updated
+                ),
+                "sourceId": source_id,
+            },
+        )
+        return len(page) == self.batch_size
+
+    def scan_webs(self) -> bool:
+        # one batch of a web's source IDs per step: the offset into the web is
+        # kept in the watermark, so a large web spans several steps and runs
+        watermark = self.get_watermark(
+            "webs", {"updated": EPOCH, "webId": "", "offset": 0}
+        )
+        offset = watermark.get("offset", 0)
+        web = None
+        if offset:
+            # part way through a web; if it changed since, it is scanned again
+            # from the start once the scan reaches its new `updated`
+            web = Webs.find_one(
+                {"webId": watermark["webId"], "updated": watermark["updated"]},
+                self.web_page(offset),
+            )
+        if web is None:
+            offset = 0
+            web = Webs.find_one(
+                {
+                    "$or": [
+                        {"updated": {"$gt": watermark["updated"]}},
+                        {
+                            "updated": watermark["updated"],
+                            "webId": {"$gt": watermark["webId"]},
+                        },
+                    ],
+                    "updated": {
+                        "$lt": datetime.now() - timedelta(seconds=SETTLE_SECONDS)
+                    },
+                },
+                self.web_page(0),
+                sort=[("updated", 1), ("webId", 1)],
+            )
+        if web is None:
+            return False
+
+        source_ids = web.get("sourceIds", [])
+        removed = self.reconcile(source_ids).get(web["webId"], [])
+        self.set_watermark(
+            "webs",
+            {
+                "updated": web["updated"],
+                "webId": web["webId"],
+                # IDs pulled from this web shift the rest of it back; reset
+                # once the web is done, so the next step moves past it
+                "offset": (
+                    offset + len(source_ids) - len(removed)
+                    if len(source_ids) == self.batch_size
+                    else 0
+                ),
+            },
+        )
+        return True
+
+    def web_page(self, offset: int) -> Dict[str, Any]:
+        return {
+            "webId": 1,
+            "updated": 1,
+            "sourceIds": {"$slice": [offset, self.batch_size]},
+        }
+
+    def wait_for_batch(self) -> None:
+        while not self.bucket.try_acquire() and not self.stopped.is_set():
+            time.sleep(0.05)
+
+    def run_once(self) -> None:
+        """
+        Runs the passes in order, at most `max_batches` batches in total and
+        no faster than the configured batches per second.
+        """
+        if not self.acquire_lease(settings.reconciler_interval_seconds * 2):
+            return
+
+        started = time.monotonic()
+        budget = self.max_batches
+        try:
+            for step in (self.drain_change_log, self.scan_sources, self.scan_webs):
+                while budget > 0 and not self.stopped.is_set():
+                    self.wait_for_batch()
+                    budget -= 1
+                    if not step():
+                        break
+        except Exception as e:
+            self.count(errors=1)
+            print(f"ERROR reconciling stores: {e}", file=sys.stderr)
+        finally:
+            self.count(runs=1)
+            with self.lock:
+                self.last_run = {
+                    "finished": datetime.now().isoformat(),
+                    "durationMs": round((time.monotonic() - started) * 1000, 3),
+                    "batches": self.max_batches - budget,
+                }
+            print(f"Reconciler run: {self.metrics()}", file=sys.stderr)
+
+
+reconciler = Reconciler(
+    settings.reconciler_batch_size,
+    settings.reconciler_batches_per_second,
+    settings.reconciler_max_batches,
+)
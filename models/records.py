@@ -0,0 +1,55 @@
+"""
+Compact typed records for Neo4j results.
+
+Queries return the columns listed in SOURCE_COLUMNS / CONNECTION_COLUMNS, in
+field order, so each Bolt record (a tuple) is unpacked straight into a record
+with `SourceRecord(*record)`, with no intermediate dict from `record.data()`.
+Temporal values are formatted by the server with `toString()`: formatting
+`neo4j.time` values in Python costs more than the rest of the record path
+put together (see bench/serialization.py).
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass(slots=True)
+class SourceRecord:
+    sourceId: str
+    webId: str
+    userId: str
+    name: str
+    type: Optional[str]
+    url: Optional[str]
+    content: Optional[str]
+    size: Optional[int]
+    created: Any
+    updated: Any
+
+    def as_properties(self) -> Dict[str, Any]:
+        """Properties to write to Neo4j, leaving out unset ones as Neo4j does."""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if getattr(self, name) is not None
+        }
+
+
+@dataclass(slots=True)
+class ConnectionRecord:
+    id: Optional[str]
+    sourceId: str
+    targetId: str
+    created: Any
+    updated: Any
+
+
+SOURCE_COLUMNS = """
+s.sourceId, s.webId, s.userId, s.name, s.type, s.url, s.content,
+toInteger(s.size), toString(s.created), toString(s.updated)
+"""
+
+CONNECTION_COLUMNS = """
+coalesce(c.connectionId, c.id), s.sourceId, t.sourceId, toString(c.created),
+toString(c.updated)
+"""
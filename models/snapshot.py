@@ -0,0 +1,296 @@
+"""
+Streaming export and import of a whole web.
+
+A snapshot is a single file holding a web's Mongo `webs` document, its Neo4j
+sources and connections and their Pinecone vectors, written as a stream of
+msgpack frames:
+
+    header      {"format", "version", "webId"}
+    web         {"document": BSON bytes, "vector": vector or None}
+    sources     {"records": [...], "vectorIds": [...], "vectors": float32 block,
+                 "dimension", "sparse": [...], "metadata": [...]}  (repeated)
+    connections {"records": [...]}                           (repeated)
+    end         {"sources": n, "connections": m}
+
+Frames hold at most `batch_size` records, so both directions run in constant
+memory, and vectors are stored as raw float32 so import never re-embeds.
+
+Usage:
+    python -m models.snapshot export <webId> <path>
+    python -m models.snapshot import <path>
+"""
+
+import bson
+import msgpack
+import numpy as np
+import sys
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+from neo4j.time import Date, DateTime, Time
+from db.index import neo4jClient, pineconeClient, mongoDBClient
+from models.web import Webs
+from models.sparse import record_sparse_documents
+
+FORMAT = "spydr-web-snapshot"
+VERSION = 1
+BATCH_SIZE = 500
+
+EXT_DATETIME = 1
+EXT_DATE = 2
+EXT_TIME = 3
+
+
+def _encode_ext(value: Any) -> msgpack.ExtType:
+    # Neo4j temporal values are kept as ISO strings tagged with their type, so
+    # they are written back as the same Cypher type (and timezone) on import
+    if isinstance(value, DateTime):
+        return msgpack.ExtType(EXT_DATETIME, value.iso_format().encode())
+    if isinstance(value, Date):
+        return msgpack.ExtType(EXT_DATE, value.iso_format().encode())
+    if isinstance(value, Time):
+        return msgpack.ExtType(EXT_TIME, value.iso_format().encode())
+    raise TypeError(f"Cannot serialize {type(value).__name__} in a snapshot")
+
+
+def _decode_ext(code: int, data: bytes) -> Any:
+    if code == EXT_DATETIME:
+        return DateTime.from_iso_format(data.decode())
+    if code == EXT_DATE:
+        return Date.from_iso_format(data.decode())
+    if code == EXT_TIME:
+        return Time.from_iso_format(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _batched(
+    records: Iterator[Dict[str, Any]], size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _vector_dict(vector: Any) -> Optional[Dict[str, Any]]:
+    if vector is None:
+        return None
+    sparse = vector.sparse_values
+    return {
+        "id": vector.id,
+        "values": vector.values,
+        "metadata": vector.metadata or {},
+        "sparse": (
+            {"indices": list(sparse.indices), "values": list(sparse.values)}
+            if sparse
+            else None
+        ),
+    }
+
+
+def _vector_block(source_ids: List[str]) -> Dict[str, Any]:
+    vectors = pineconeClient.fetch_vectors(source_ids, namespace="sources")
+    found = [
+        _vector_dict(vectors[source_id])
+        for source_id in source_ids
+        if source_id in vectors
+    ]
+    return {
+        "vectorIds": [vector["id"] for vector in found],
+        "vectors": (
+            np.asarray(
+                [vector["values"] for vector in found], dtype=np.float32
+            ).tobytes()
+            if found
+            else b""
+        ),
+        "dimension": len(found[0]["values"]) if found else 0,
+        "sparse": [vector["sparse"] for vector in found],
+        "metadata": [vector["metadata"] for vector in found],
+    }
+
+
+def export_web(
+    web_id: str, output: BinaryIO, batch_size: int = BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Streams a web's Mongo document, sources, connections and vectors to a
+    snapshot file.
+
+    Args:
+        web_id (str): The ID of the web to export.
+        output (BinaryIO): A binary file opened for writing.
+        batch_size (int): The maximum number of records per frame.
+
+    Returns:
+        Dict[str, int]: The number of sources, vectors and connections exported.
+    """
+    with mongoDBClient.guarded():
+        web = Webs.find_one({"webId": web_id})
+    if web is None:
+        raise ValueError(f"Web not found: {web_id}")
+
+    packer = msgpack.Packer(default=_encode_ext, use_bin_type=True)
+    counts = {"sources": 0, "vectors": 0, "connections": 0}
+
+    output.write(
+        packer.pack(
+            {"kind": "header", "format": FORMAT, "version": VERSION, "webId": web_id}
+        )
+    )
+    output.write(
+        packer.pack(
+            {
+                "kind": "web",
+                "document": bson.encode(web),
+                "vector": _vector_dict(
+                    pineconeClient.fetch_vectors([web_id], namespace="webs").get(web_id)
+                ),
+            }
+        )
+    )
+
+    for sources in _batched(neo4jClient.stream_sources_for_web(web_id), batch_size):
+        block = _vector_block([source["sourceId"] for source in sources])
+        output.write(packer.pack({"kind": "sources", "records": sources, **block}))
+        counts["sources"] += len(sources)
+        counts["vectors"] += len(block["vectorIds"])
+
+    for connections in _batched(
+        neo4jClient.stream_connections_for_web(web_id), batch_size
+    ):
+        output.write(packer.pack({"kind": "connections", "records": connections}))
+        counts["connections"] += len(connections)
+
+    output.write(packer.pack({"kind": "end", **counts}))
+    print(f"Exported web {web_id}: {counts}", file=sys.stderr)
+    return counts
+
+
+def _upsert_vector_block(frame: Dict[str, Any]) -> int:
+    ids = frame["vectorIds"]
+    if not ids:
+        return 0
+
+    values = np.frombuffer(frame["vectors"], dtype=np.float32).reshape(
+        len(ids), frame["dimension"]
+    )
+    vectors = []
+    for i, vector_id in enumerate(ids):
+        vector = {
+            "id": vector_id,
+            "values": values[i].tolist(),
+            "metadata": frame["metadata"][i],
+        }
+        if frame["sparse"][i] and pineconeClient.supports_sparse():
+            vector["sparse_values"] = frame["sparse"][i]
+        vectors.append(vector)
+
+    pineconeClient.upsert_vectors(vectors, namespace="sources")
+    return len(vectors)
+
+
+def import_web(snapshot: BinaryIO) -> Dict[str, int]:
+    """
+    Streams a snapshot file back into Neo4j, Mongo and Pinecone. Sources are
+    merged on sourceId and connections on their connectionId, so importing the
+    same snapshot twice does not duplicate graph data or vectors. Sources that
+    did not exist before are also added to the BM25 vocabulary statistics.
+
+    Args:
+        snapshot (BinaryIO): A binary file opened for reading.
+
+    Returns:
+        Dict[str, int]: The number of sources, vectors and connections imported,
+            and of connections skipped for having no ID.
+
+    Raises:
+        ValueError: If the snapshot is truncated or its records don't add up to
+            the counts in its end frame. Frames before the damage are imported.
+    """
+    unpacker = msgpack.Unpacker(snapshot, ext_hook=_decode_ext, raw=False)
+    counts = {"sources": 0, "vectors": 0, "connections": 0, "skippedConnections": 0}
+    # records read, checked against what the exporter wrote in the end frame
+    read = {"sources": 0, "vectors": 0, "connections": 0}
+    end = None
+
+    header = next(unpacker, None)
+    if not header or header.get("format") != FORMAT:
+        raise ValueError("Not a web snapshot")
+    if header["version"] > VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header['version']}")
+
+    for frame in unpacker:
+        kind = frame["kind"]
+
+        if kind == "web":
+            document = bson.decode(frame["document"])
+            # the target may hold this web under another _id (e.g. recreated),
+            # and a replace can't change _id
+            document.pop("_id", None)
+            with mongoDBClient.guarded():
+                Webs.replace_one({"webId": document["webId"]}, document, upsert=True)
+            if frame["vector"]:
+                vector = frame["vector"]
+                web_vector = {
+                    "id": vector["id"],
+                    "values": vector["values"],
+                    "metadata": vector["metadata"],
+                }
+                if vector["sparse"] and pineconeClient.supports_sparse():
+                    web_vector["sparse_values"] = vector["sparse"]
+                pineconeClient.upsert_vectors([web_vector], namespace="webs")
+
+        elif kind == "sources":
+            created = set(neo4jClient.merge_many_sources(frame["records"]))
+            read["sources"] += len(frame["records"])
+            read["vectors"] += len(frame["vectorIds"])
+            counts["sources"] += len(frame["records"])
+            counts["vectors"] += _upsert_vector_block(frame)
+            # sources already in Neo4j were counted when they were first ingested
+            record_sparse_documents(
+                [
+                    pineconeClient.sparse_encoder.add_document(
+                        f"{source['name']}\n{source.get('content') or ''}"
+                    )
+                    for source in frame["records"]
+                    if source["sourceId"] in created
+                ]
+            )
+
+        elif kind == "connections":
+            merged, skipped = neo4jClient.merge_many_connections(frame["records"])
+            read["connections"] += len(frame["records"])
+            counts["connections"] += merged
+            counts["skippedConnections"] += skipped
+
+        elif kind == "end":
+            end = frame
+            break
+
+    if end is None:
+        raise ValueError(
+            f"Snapshot of web {header['webId']} is truncated: no end frame"
+        )
+    expected = {name: end[name] for name in read}
+    if read != expected:
+        raise ValueError(
+            f"Snapshot of web {header['webId']} is corrupt: read {read}, expected {expected}"
+        )
+
+    print(f"Imported web {header['webId']}: {counts}", file=sys.stderr)
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "export":
+        with open(sys.argv[3], "wb") as output:
+            export_web(sys.argv[2], output)
+    elif len(sys.argv) == 3 and sys.argv[1] == "import":
+        with open(sys.argv[2], "rb") as snapshot:
+            import_web(snapshot)
+    else:
+        print(__doc__, file=sys.stderr)
+        sys.exit(1)
@@ -3,8 +3,13 @@ from typing import Optional
 from datetime import datetime
 from uuid import uuid4
 from models.web import Webs
-from db.index import neo4jClient
-from pymongo.results import UpdateResult
+from db.index import neo4jClient, mongoDBClient, pineconeClient
+from models.sparse import record_sparse_document
+from models.connection import connect_new_source
+from models.records import SourceRecord
+from models.reconciler import log_source_change
+from core.governor import OverloadedError, DeadlineExceededError
+from core.cache import cache
 import sys
 
 
@@ -43,37 +48,72 @@ class CreateSource(BaseModel):
     type: str
 
 
-def create_source(sourceToCreate: CreateSource):
+def create_source(sourceToCreate: CreateSource) -> SourceRecord:
     if not sourceToCreate:
         raise ValueError("Source object and user ID is required")
 
+    sourceId = str(uuid4())
+    print(f"Source ID: {sourceId}", file=sys.stderr)
+    # sourceToCreate is already validated, so the record is built directly
+    # rather than round-tripping through the Source model
+    now = datetime.now()
+    source = SourceRecord(
+        sourceId=sourceId,
+        webId=sourceToCreate.webId,
+        userId=sourceToCreate.userId,
+        name=sourceToCreate.name,
+        type=sourceToCreate.type,
+        url=None,
+        content=sourceToCreate.content,
+        size=len(sourceToCreate.content) * 200,
+        created=now,
+        updated=now,
+    )
+    properties = source.as_properties()
+
+    # nothing is written before the Neo4j node, so a call shed here can simply
+    # be retried; a shed call rolls back, any other error may have committed
     try:
+        source = neo4jClient.create_source(source)
+    except (OverloadedError, DeadlineExceededError):
+        raise
+    except Exception as e:
+        print(f"ERROR creating source: {e}", file=sys.stderr)
+        log_source_change(sourceId, sourceToCreate.webId)
+        raise
+    print(f"Created source in neo4j: {source}", file=sys.stderr)
 
-        sourceId = str(uuid4())
-        print(f"Source ID: {sourceId}", file=sys.stderr)
-        source = Source(
-            sourceId=sourceId,
-            webId=sourceToCreate.webId,
-            userId=sourceToCreate.userId,
-            name=sourceToCreate.name,
-            content=sourceToCreate.content,
-            type=sourceToCreate.type,
-            size=len(sourceToCreate.content) * 200,
-            created=datetime.now(),
-            updated=datetime.now(),
-        )
-        source = neo4jClient.create_node("source", source.model_dump())
-        print(f"Created source in neo4j: {source}", file=sys.stderr)
-        result: UpdateResult = Webs.update_one(
-            {"webId": sourceToCreate.webId},
-            {"$addToSet": {"sourceIds": sourceId}},
-        )
-        print(f"Webs modified: {result.modified_count}", file=sys.stderr)
-        return source
+    # from here on the source is saved: a retry would duplicate it, so errors
+    # (shed calls included) are left to the reconciler and the call succeeds
+    try:
+        with mongoDBClient.guarded():
+            web = Webs.find_one_and_update(
+                {"webId": sourceToCreate.webId},
+                {"$addToSet": {"sourceIds": sourceId}},
+                projection={"enableAIConnections": True},
+            )
+        print(f"Web updated: {web is not None}", file=sys.stderr)
+        term_counts, vector = pineconeClient.upsert_source(properties)
+        record_sparse_document(term_counts)
 
     except Exception as e:
 
-        print(f"ERROR creating source: {e}", file=sys.stderr)
+        print(f"ERROR indexing source {sourceId}: {e}", file=sys.stderr)
+        log_source_change(sourceId, sourceToCreate.webId)
+
+    else:
+        if web and web.get("enableAIConnections", True):
+            # best-effort: the source is saved and indexed whether or not it
+            # gets connected, and the stores agree either way
+            try:
+                connect_new_source(sourceToCreate.webId, sourceId, vector)
+            except Exception as e:
+                print(f"ERROR connecting source {sourceId}: {e}", file=sys.stderr)
+
+    # invalidates cached query results; with the default in-process cache
+    # only this worker's, others serve theirs for up to RESULT_CACHE_TTL_SECONDS
+    cache.incr("sources:generation")
+    return source
 
 
 class UpdateSource(BaseModel):
@@ -0,0 +1,62 @@
+from pymongo import UpdateOne
+from collections import Counter
+from typing import Dict, List
+from core.sparse import BM25Encoder
+from db.index import mongoDBClient
+import sys
+
+# one document per sparse index with its document frequency, plus a totals doc
+SparseStats = mongoDBClient.get_collection("sparseStats")
+
+TOTALS_ID = "totals"
+
+
+def load_sparse_stats(encoder: BM25Encoder) -> None:
+    """
+    Loads the BM25 vocabulary statistics persisted by `record_sparse_document`
+    into the given encoder.
+    """
+    totals = SparseStats.find_one({"_id": TOTALS_ID}) or {}
+    df = (
+        (doc["_id"], doc["df"]) for doc in SparseStats.find({"_id": {"$ne": TOTALS_ID}})
+    )
+    encoder.load(totals.get("nDocs", 0), totals.get("totalLength", 0), df)
+    print(f"Loaded sparse stats for {encoder.n_docs} documents", file=sys.stderr)
+
+
+def record_sparse_document(term_counts: Dict[int, int]) -> None:
+    """
+    Persists the statistics of one newly ingested document. Increments are
+    atomic, so concurrent ingests from several processes add up correctly.
+    """
+    record_sparse_documents([term_counts])
+
+
+def record_sparse_documents(documents: List[Dict[int, int]]) -> None:
+    """Persists the statistics of a batch of documents in one bulk write."""
+    documents = [term_counts for term_counts in documents if term_counts]
+    if not documents:
+        return
+
+    df = Counter()
+    for term_counts in documents:
+        df.update(term_counts.keys())
+
+    operations = [
+        UpdateOne({"_id": index}, {"$inc": {"df": count}}, upsert=True)
+        for index, count in df.items()
+    ]
+    operations.append(
+        UpdateOne(
+            {"_id": TOTALS_ID},
+            {
+                "$inc": {
+                    "nDocs": len(documents),
+                    "totalLength": sum(sum(tc.values()) for tc in documents),
+                }
+            },
+            upsert=True,
+        )
+    )
+    with mongoDBClient.guarded():
+        SparseStats.bulk_write(operations, ordered=False)
@@ -0,0 +1,16 @@
+import os
+
+# core.config requires these to build Settings; tests never reach the databases
+for name in (
+    "MONGO_INITDB_DATABASE",
+    "MONGO_URL",
+    "NEO4J_URI",
+    "NEO4J_USERNAME",
+    "NEO4J_PASSWORD",
+    "FASTAPI_ENV",
+    "FASTAPI_SECRET_KEY",
+    "FASTAPI_API_URL",
+    "PINECONE_API_KEY",
+    "PINECONE_INDEX_NAME",
+):
+    os.environ.setdefault(name, "test")
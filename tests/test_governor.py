@@ -0,0 +1,116 @@
+import threading
+import time
+import anyio
+from core.governor import Governor, OverloadedError, DeadlineExceededError
+
+
+def make_governor(**overrides) -> Governor:
+    options = dict(
+        limits={"neo4j": 2},
+        max_queue=2,
+        user_rate=1000.0,
+        user_burst=1000.0,
+        default_timeout=5.0,
+    )
+    options.update(overrides)
+    return Governor(**options)
+
+
+async def tool_call(governor: Governor, work, user_id: str = "user") -> str:
+    # the same shape as the tools in main.py: admitted on the event loop, the
+    # blocking backend call run in a worker thread
+    try:
+        with governor.request(user_id):
+            return await anyio.to_thread.run_sync(work)
+    except (OverloadedError, DeadlineExceededError) as e:
+        return type(e).__name__
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    with anyio.fail_after(timeout):
+        while not condition():
+            await anyio.sleep(0.01)
+
+
+def test_concurrent_tool_calls_beyond_queue_are_shed():
+    governor = make_governor()
+    release = threading.Event()
+
+    def work():
+        with governor.limit("neo4j"):
+            release.wait(5)
+            return "ok"
+
+    async def main():
+        results = []
+
+        async def call():
+            results.append(await tool_call(governor, work))
+
+        async with anyio.create_task_group() as tasks:
+            for _ in range(10):
+                tasks.start_soon(call)
+            limiter = governor.backends["neo4j"]
+            await wait_until(
+                lambda: limiter.in_flight == 2
+                and limiter.waiting == 2
+                and limiter.rejected == 6
+            )
+            release.set()
+        return results
+
+    results = anyio.run(main)
+
+    assert sorted(results) == ["OverloadedError"] * 6 + ["ok"] * 4
+    metrics = governor.metrics()["backends"]["neo4j"]
+    assert metrics["admitted"] == 4
+    assert metrics["rejected"] == 6
+    assert metrics["inFlight"] == 0
+
+
+def test_deadline_carries_into_worker_thread():
+    governor = make_governor(limits={"neo4j": 1}, default_timeout=0.2)
+    release = threading.Event()
+
+    def blocking():
+        with governor.limit("neo4j"):
+            release.wait(5)
+            return "ok"
+
+    def remaining():
+        return governor.remaining()
+
+    async def main():
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(tool_call, governor, blocking)
+            await wait_until(lambda: governor.backends["neo4j"].in_flight == 1)
+            started = time.monotonic()
+            shed = await tool_call(governor, blocking)
+            waited = time.monotonic() - started
+            left = await tool_call(governor, remaining)
+            release.set()
+        return shed, waited, left
+
+    shed, waited, left = anyio.run(main)
+
+    assert shed == "DeadlineExceededError"
+    assert waited < 1.0
+    assert 0 < left <= 0.2
+    assert governor.backends["neo4j"].metrics()["timedOut"] == 1
+
+
+def test_rate_limited_user_is_shed_before_any_backend_call():
+    governor = make_governor(user_rate=0.001, user_burst=2)
+    calls = []
+
+    def work():
+        with governor.limit("neo4j"):
+            calls.append(1)
+            return "ok"
+
+    async def main():
+        return [await tool_call(governor, work) for _ in range(3)]
+
+    assert anyio.run(main) == ["ok", "ok", "OverloadedError"]
+    assert len(calls) == 2
+    assert governor.metrics()["throttled"] == 1
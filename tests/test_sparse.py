@@ -0,0 +1,71 @@
+import math
+import pytest
+from core.sparse import BM25Encoder, hybrid_scale, token_index, tokenize
+
+
+def test_compound_tokens_are_kept_whole_and_split():
+    assert tokenize("Got ERR_CONN_RESET from https://x.com/a?b=1") == [
+        "got",
+        "err_conn_reset",
+        "err",
+        "conn",
+        "reset",
+        "https://x.com/a?b=1",
+        "https",
+        "x",
+        "com",
+        "b",
+        "1",
+    ]
+
+
+def test_stopword_only_text_encodes_to_empty_vectors():
+    encoder = BM25Encoder()
+    encoder.add_document("alpha beta")
+
+    assert tokenize("The and OF") == []
+    assert encoder.encode_query("the and of") == {"indices": [], "values": []}
+    assert encoder.encode_document("the and of") == {"indices": [], "values": []}
+
+
+def test_document_weights_are_saturated_but_not_normalized():
+    # with no documents yet the average length is the document's own, so the
+    # length norm is k1: tf * (k1 + 1) / (tf + k1)
+    encoded = BM25Encoder(k1=1.2, b=0.75).encode_document("alpha alpha beta")
+    weights = dict(zip(encoded["indices"], encoded["values"]))
+
+    assert weights == {
+        token_index("alpha"): pytest.approx(2 * 2.2 / 3.2),
+        token_index("beta"): pytest.approx(1.0),
+    }
+
+
+def test_query_weights_are_idf_normalized_to_sum_to_one():
+    encoder = BM25Encoder()
+    for text in ("alpha beta", "alpha gamma", "alpha delta"):
+        encoder.add_document(text)
+
+    encoded = encoder.encode_query("alpha beta")
+    weights = dict(zip(encoded["indices"], encoded["values"]))
+    alpha = math.log(1 + 0.5 / 3.5)
+    beta = math.log(1 + 2.5 / 1.5)
+
+    assert weights == {
+        token_index("alpha"): pytest.approx(alpha / (alpha + beta)),
+        token_index("beta"): pytest.approx(beta / (alpha + beta)),
+    }
+
+
+def test_hybrid_scale_weights_dense_by_alpha_and_sparse_by_the_rest():
+    dense, sparse = hybrid_scale(
+        [1.0, -2.0], {"indices": [7, 9], "values": [0.5, 0.25]}, 0.25
+    )
+
+    assert dense == [0.25, -0.5]
+    assert sparse == {"indices": [7, 9], "values": [0.375, 0.1875]}
+
+
+@pytest.mark.parametrize("alpha", [-0.1, 1.5])
+def test_hybrid_scale_rejects_alpha_outside_unit_interval(alpha):
+    with pytest.raises(ValueError):
+        hybrid_scale([1.0], {"indices": [1], "values": [1.0]}, alpha)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from core.vectors import mmr, top_k_neighbours
+
+# candidates 0 and 1 are near-duplicates, 2 is unlike both
+SIMILARITIES = np.array(
+    [
+        [1.0, 0.99, 0.1],
+        [0.99, 1.0, 0.2],
+        [0.1, 0.2, 1.0],
+    ],
+    dtype=np.float32,
+)
+RELEVANCE = np.array([0.9, 0.85, 0.5], dtype=np.float32)
+
+
+def test_mmr_skips_near_duplicates_for_diverse_picks():
+    # second pick: 0.5 * 0.85 - 0.5 * 0.99 < 0.5 * 0.5 - 0.5 * 0.1
+    assert mmr(RELEVANCE, SIMILARITIES, 2, 0.5) == [0, 2]
+
+
+def test_mmr_with_lambda_one_is_ranking_by_relevance():
+    assert mmr(RELEVANCE, SIMILARITIES, 2, 1.0) == [0, 1]
+
+
+def test_mmr_returns_every_candidate_once_when_k_exceeds_n():
+    assert mmr(RELEVANCE, SIMILARITIES, 5, 0.5) == [0, 2, 1]
+
+
+def test_mmr_with_no_picks_or_no_candidates_is_empty():
+    assert mmr(RELEVANCE, SIMILARITIES, 0, 0.5) == []
+    assert mmr(np.array([]), np.zeros((0, 0)), 3, 0.5) == []
+
+
+# unit vectors with a.b = 0.8, b.c = 0.6, a.c = c.d = 0, b.d = -0.8, a.d = -1
+UNIT_ROWS = np.array(
+    [[1.0, 0.0], [0.8, 0.6], [0.0, 1.0], [-1.0, 0.0]], dtype=np.float32
+)
+
+
+def by_row(neighbours):
+    return [
+        (row, column, pytest.approx(score))
+        for row, column, score in sorted(neighbours)
+    ]
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 1024])
+def test_top_k_neighbours_excludes_self_and_applies_threshold(block_size):
+    # every row is most similar to itself; d has no neighbour above 0.5
+    neighbours = top_k_neighbours(UNIT_ROWS, 1, 0.5, block_size=block_size)
+
+    assert by_row(neighbours) == [(0, 1, 0.8), (1, 0, 0.8), (2, 1, 0.6)]
+
+
+def test_top_k_neighbours_caps_k_at_the_other_rows():
+    neighbours = top_k_neighbours(UNIT_ROWS, 10, -2.0)
+
+    assert len(neighbours) == 4 * 3
+    assert all(row != column for row, column, _ in neighbours)
+    assert sorted(column for row, column, _ in neighbours if row == 2) == [0, 1, 3]
+
+
+def test_top_k_neighbours_of_a_single_row_is_empty():
+    assert top_k_neighbours(UNIT_ROWS[:1], 3, 0.0) == []